@@ -0,0 +1,47 @@
+import argparse
+import json
+
+
+# 读取结果文件，按 (规模, 阶段) 索引
+def load_results(path):
+    with open(path, encoding='utf-8') as f:
+        result = json.load(f)
+    return result['meta'], {(item['size'], item['stage']): item for item in result['results']}
+
+
+# 对比两次基准结果：耗时与内存峰值的比值（新/旧），超过阈值的阶段标记为回退；
+# 新旧耗时都低于 min_seconds 的阶段只展示不判定（计时噪声大）
+def compare(baseline_path, current_path, threshold=1.2, min_seconds=0.05):
+    baseline_meta, baseline = load_results(baseline_path)
+    current_meta, current = load_results(current_path)
+    print(f"基准: {baseline_path} ({baseline_meta.get('commit') or '-'})")
+    print(f"当前: {current_path} ({current_meta.get('commit') or '-'})")
+    print(f"{'规模':>9}  {'阶段':<20} {'旧耗时':>9} {'新耗时':>9} {'比值':>6} {'旧峰值MB':>9} {'新峰值MB':>9} {'比值':>6}")
+
+    regressions = []
+    for key in sorted(set(baseline) & set(current)):
+        old, new = baseline[key], current[key]
+        time_ratio = new['seconds'] / old['seconds'] if old['seconds'] else float('inf')
+        mem_ratio = new['peak_mb'] / old['peak_mb'] if old['peak_mb'] else float('inf')
+        timed = max(old['seconds'], new['seconds']) >= min_seconds
+        flag = '  ← 回退' if (timed and time_ratio > threshold) or mem_ratio > threshold else ''
+        if flag:
+            regressions.append(key)
+        print(f"{key[0]:>9}  {key[1]:<20} {old['seconds']:9.3f} {new['seconds']:9.3f} {time_ratio:6.2f} "
+              f"{old['peak_mb']:9.1f} {new['peak_mb']:9.1f} {mem_ratio:6.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.compare', description='对比两次基准结果')
+    parser.add_argument('baseline', help='基准结果 JSON')
+    parser.add_argument('current', help='当前结果 JSON')
+    parser.add_argument('--threshold', type=float, default=1.2, help='回退阈值（新/旧），默认 1.2')
+    parser.add_argument('--min-seconds', type=float, default=0.05, help='低于该耗时的阶段不判定耗时回退，默认 0.05')
+    args = parser.parse_args(argv)
+    regressions = compare(args.baseline, args.current, args.threshold, args.min_seconds)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,214 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import DEFAULT_ORG_SHAPE, generate_rosters, generate_fee_input
+from service.cal_fee import compute_fee_months, fee_rollup
+from service.compact import compact_frames, memory_report
+from service.instrument import span
+from service.merge_info import (
+    read_file, rename_df, collect_employee_ids, rank_clo,
+    process_employee_data, process_abnormal_employee_data, process_all_levels
+)
+from service.writer import write_excel
+
+
+# 默认规模与结果目录
+DEFAULT_SIZES = '10k,100k,1M'
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+# "10k,100k,1M" → [10000, 100000, 1000000]
+def parse_sizes(text):
+    units = {'k': 1_000, 'm': 1_000_000}
+    sizes = []
+    for item in text.split(','):
+        item = item.strip().lower()
+        if item:
+            sizes.append(int(float(item[:-1]) * units[item[-1]]) if item[-1] in units else int(item))
+    return sizes
+
+
+# 计时一个阶段：先按 repeat 次数取最快耗时（不开 tracemalloc），再单独跑一次 tracemalloc 记录内存峰值
+# 各阶段内部的 span 会重置 tracemalloc 峰值，因此外层同样用 span 记录，由其汇总嵌套阶段的峰值
+def measure(fn, repeat):
+    timings = []
+    result = None
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = fn()
+            timings.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        try:
+            with span('benchmark') as record:
+                fn()
+        finally:
+            tracemalloc.stop()
+    return result, {'seconds': min(timings), 'seconds_all': timings, 'peak_mb': record['peak_mb']}
+
+
+# 阶段输出行数：DataFrame 取行数，多层级结果 {层级: (员工数据, 异常员工数据)} 取各层级员工数据行数之和
+def _row_count(result):
+    if isinstance(result, dict):
+        return sum(len(frames[0]) for frames in result.values())
+    return len(result) if hasattr(result, '__len__') else None
+
+
+# 花名册写成 Excel 文件（读取阶段使用）
+def write_rosters(directory, df_transfer, df_onboard, df_resigned):
+    paths = []
+    for name, df in (('调动', df_transfer), ('在职', df_onboard), ('离职', df_resigned)):
+        path = os.path.join(directory, f"{name}.xlsx")
+        write_excel({'Sheet1': df}, path)
+        paths.append(path)
+    return paths
+
+
+# 单个规模的全部阶段，返回 (阶段记录, 内存报告)
+def bench_size(size, args):
+    print(f"== {size} 名员工 ==")
+    records = []
+    memory = []
+
+    def record(stage, fn, rows_in, repeat=args.repeat):
+        result, stats = measure(fn, repeat)
+        rows_out = _row_count(result)
+        records.append({'size': size, 'stage': stage, 'rows_in': rows_in, 'rows_out': rows_out, **stats})
+        print(f"  {stage:<20} {stats['seconds']:9.3f}s  峰值 {stats['peak_mb']:9.1f} MB  输出 {rows_out} 行")
+        return result
+
+    start = time.perf_counter()
+    df_transfer, df_onboard, df_resigned = generate_rosters(
+        size, year=args.year, transfer_rate=args.transfer_rate, exit_rate=args.exit_rate,
+        org_shape=args.org_shape, duplicate_rate=args.duplicate_rate, seed=args.seed
+    )
+    print(f"  生成数据耗时 {time.perf_counter() - start:.2f}s："
+          f"调动 {len(df_transfer)} 行，在职 {len(df_onboard)} 行，离职 {len(df_resigned)} 行")
+
+    # 读取阶段需要先写出 Excel，规模过大时跳过
+    if args.io and size <= args.io_max_size:
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = write_rosters(tmp, df_transfer, df_onboard, df_resigned)
+            record('read_file', lambda: read_file(*paths)[0], size, repeat=1)
+
+    df_zai = df_onboard
+    df_li = rename_df(rename_df(df_resigned, '最后工作日', '离职日期'), '部门', '四级组织')
+
+    # 与 read_file 一致：后续阶段都在紧凑表示（分类编码）上运行，同时记录转换前后的内存
+    frames = {'调动': df_transfer, '在职': df_zai, '离职': df_li}
+    compacted = record('compact', lambda: compact_frames(*frames.values()), len(df_transfer) + len(df_zai) + len(df_li))
+    raw_report = memory_report(frames)
+    compact_report = memory_report(dict(zip(frames, compacted)))
+    for raw_row, compact_row in zip(raw_report, compact_report):
+        memory.append({'size': size, 'frame': raw_row['数据表'], 'rows': raw_row['行数'], 'raw_mb': raw_row['内存(MB)'],
+                       'compact_data_mb': compact_row['数据(MB)'], 'compact_dictionary_mb': compact_row['字典(MB)']})
+        print(f"  内存 {raw_row['数据表']:<4} {raw_row['内存(MB)']:9.1f} MB -> 数据 {compact_row['数据(MB)']:7.1f} MB"
+              f" + 字典 {compact_row['字典(MB)']:7.1f} MB")
+    df_transfer, df_zai, df_li = compacted
+    all_employees_set = collect_employee_ids(df_zai, df_li)
+    n_rows = len(df_transfer) + len(df_zai) + len(df_li)
+
+    level = args.level
+    employee_df = record('merge_employee', lambda: process_employee_data(
+        level, all_employees_set, df_transfer, df_zai, df_li, None), n_rows)
+    record('merge_abnormal', lambda: process_abnormal_employee_data(
+        level, all_employees_set, df_transfer, None), len(df_transfer))
+    record('merge_timeline', lambda: process_employee_data(
+        level, all_employees_set, df_transfer, df_zai, df_li, None, timeline=True), n_rows)
+    record('merge_all_levels', lambda: process_all_levels(
+        all_employees_set, df_transfer, df_zai, df_li), n_rows)
+
+    fee_df = generate_fee_input(employee_df, seed=args.seed)
+    months = record('fee_months', lambda: compute_fee_months(fee_df, args.year), len(fee_df))
+    years = np.arange(args.year - 2, args.year + 1)
+    record('fee_months_3_years', lambda: compute_fee_months(fee_df, years), len(fee_df))
+    fee_df['计算月数'] = months
+    fee_df['年度经费'] = np.round(months * 50.0, 2)
+    record('fee_rollup', lambda: fee_rollup(fee_df), len(fee_df))
+
+    if args.io and size <= args.io_max_size:
+        with tempfile.TemporaryDirectory() as tmp:
+            output_df = rank_clo(employee_df)
+            record('write_excel', lambda: write_excel({'Sheet1': output_df}, os.path.join(tmp, 'out.xlsx')) or output_df,
+                   len(output_df), repeat=1)
+    return records, memory
+
+
+# 当前提交（便于不同结果文件之间对照）
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run', description='合并与经费计算流程性能基准')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help=f'员工规模列表，默认 {DEFAULT_SIZES}')
+    parser.add_argument('--repeat', type=int, default=3, help='每个阶段重复次数（取最快），默认 3')
+    parser.add_argument('--year', type=int, default=2025, help='核算年度，默认 2025')
+    parser.add_argument('--level', type=int, default=2, choices=(1, 2, 3, 4), help='合并组织层级，默认 2')
+    parser.add_argument('--transfer-rate', type=float, default=0.15, help='年内人均调动次数，默认 0.15')
+    parser.add_argument('--exit-rate', type=float, default=0.12, help='离职率，默认 0.12')
+    parser.add_argument('--duplicate-rate', type=float, default=0.01, help='重复记录占比，默认 0.01')
+    parser.add_argument('--org-shape', default=','.join(map(str, DEFAULT_ORG_SHAPE)),
+                        help='组织树每层分支数，默认 ' + ','.join(map(str, DEFAULT_ORG_SHAPE)))
+    parser.add_argument('--seed', type=int, default=0, help='随机种子，默认 0')
+    parser.add_argument('--io', action='store_true', help='同时测量 Excel 读取与写出（较慢）')
+    parser.add_argument('--io-max-size', default='100k', help='测量读写的最大规模，默认 100k')
+    parser.add_argument('-o', '--output', help=f'结果 JSON 路径，默认写入 {RESULTS_DIR}')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.org_shape = tuple(int(part) for part in args.org_shape.split(','))
+    args.io_max_size = parse_sizes(args.io_max_size)[0]
+
+    records = []
+    memory = []
+    for size in parse_sizes(args.sizes):
+        size_records, size_memory = bench_size(size, args)
+        records.extend(size_records)
+        memory.extend(size_memory)
+
+    commit = git_commit()
+    result = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': commit,
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'params': {key: value for key, value in vars(args).items() if key != 'output'},
+        'results': records,
+        'memory': memory,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"bench-{datetime.now():%Y%m%d-%H%M%S}{'-' + commit if commit else ''}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+import numpy as np
+import pandas as pd
+
+from service.columns import (
+    ORG_COLUMNS, BEFORE_ORG_COLUMNS, AFTER_ORG_COLUMNS,
+    TRANSFER_COLUMNS, ONBOARD_COLUMNS, RESIGNED_COLUMNS, DATE_COLUMNS
+)
+
+
+# 默认组织树形状：每层的分支数（一级 4 个，每个一级下 5 个二级，依此类推）
+DEFAULT_ORG_SHAPE = (4, 5, 6, 8)
+
+
+# 组织树：每层按路径编号生成名称表，叶子编号 → 各层名称
+def build_org_tree(org_shape=DEFAULT_ORG_SHAPE):
+    names = []
+    parent = np.array([''], dtype=object)
+    level_labels = ['BG', 'BU', 'D', 'T']
+    for level, branches in enumerate(org_shape):
+        suffix = np.array([f"{level_labels[level]}{i + 1:02d}" for i in range(branches)], dtype=object)
+        current = (np.repeat(parent, branches) + np.tile(suffix, len(parent))).astype(object)
+        names.append(current)
+        parent = current + '-'
+    return names
+
+
+# 叶子编号拆分为各层路径编号（混合进制）
+def leaf_paths(leaves, org_shape=DEFAULT_ORG_SHAPE):
+    paths = []
+    divisor = int(np.prod(org_shape))
+    for branches in org_shape:
+        divisor //= branches
+        paths.append(leaves // divisor)
+    return paths
+
+
+# 叶子编号 → 各层组织名称列
+def leaf_org_columns(leaves, tree, org_shape=DEFAULT_ORG_SHAPE):
+    return [tree[level][path] for level, path in enumerate(leaf_paths(leaves, org_shape))]
+
+
+# 按分歧层级选择新的叶子：divergence 层（0~3）及以下重新随机，之上保持不变；4 表示完全相同
+def _move_leaves(leaves, divergence, rng, org_shape=DEFAULT_ORG_SHAPE):
+    new_leaves = leaves.copy()
+    for level in range(len(org_shape)):
+        block = int(np.prod(org_shape[level:]))
+        moving = divergence == level
+        offset = rng.integers(0, block, moving.sum())
+        new_leaves[moving] = (leaves[moving] // block) * block + offset
+    return new_leaves
+
+
+# 在 [start, end] 区间内均匀随机日期
+def _random_dates(rng, start, end, size):
+    start = np.datetime64(start, 'D')
+    span = (np.datetime64(end, 'D') - start).astype(np.int64) + 1
+    return start + rng.integers(0, span, size).astype('timedelta64[D]')
+
+
+# 生成一套模拟花名册（列名、列顺序与真实文件一致），全部用 NumPy 批量生成：
+#   headcount          员工总数（在职 + 离职）
+#   transfer_rate      每名员工年内平均调动次数（泊松分布，同一员工可多次调动）
+#   exit_rate          年内离职员工占比
+#   org_shape          组织树每层分支数
+#   duplicate_rate     重复记录占比（在职花名册重复行、调动花名册同日重复行）
+#   abnormal_rate      调动记录中不在在职/离职名单里的异常工号占比
+#   local_move_rate    调动中组织内（至少一级组织不变）调动的占比
+# 返回 (调动, 在职, 离职) 三个原始 DataFrame，离职表使用原始列名“部门”“最后工作日”
+def generate_rosters(headcount, year=2025, transfer_rate=0.15, exit_rate=0.12, org_shape=DEFAULT_ORG_SHAPE,
+                     duplicate_rate=0.01, abnormal_rate=0.02, local_move_rate=0.5, seed=0):
+    rng = np.random.default_rng(seed)
+    tree = build_org_tree(org_shape)
+    n_leaves = int(np.prod(org_shape))
+    year_start, year_end = f"{year}-01-01", f"{year}-12-31"
+
+    emp_ids = np.array([f"E{i:07d}" for i in range(headcount)], dtype=object)
+    names = np.array([f"员工{i}" for i in range(headcount)], dtype=object)
+    hire_dates = _random_dates(rng, f"{year - 10}-01-01", year_end, headcount)
+    initial_leaves = rng.integers(0, n_leaves, headcount)
+
+    # 调动：按调动序号逐轮批量生成，每轮所有员工同时从上一轮的组织出发
+    n_transfers = rng.poisson(transfer_rate, headcount)
+    transfer_frames = []
+    current_leaves = initial_leaves.copy()
+    last_transfer = np.maximum(hire_dates, np.datetime64(year_start, 'D'))
+    for rank in range(int(n_transfers.max()) if headcount else 0):
+        movers = np.flatnonzero(n_transfers > rank)
+        local = rng.random(len(movers)) < local_move_rate
+        divergence = np.where(local, rng.integers(1, len(org_shape) + 1, len(movers)), 0)
+        before_leaves = current_leaves[movers]
+        after_leaves = _move_leaves(before_leaves, divergence, rng, org_shape)
+
+        # 调动日期晚于上一次调动（或入职），不晚于年末
+        gap = (np.datetime64(year_end, 'D') - last_transfer[movers]).astype(np.int64)
+        dates = last_transfer[movers] + (rng.random(len(movers)) * np.maximum(gap, 0) / 2).astype('timedelta64[D]')
+        last_transfer[movers] = dates
+        current_leaves[movers] = after_leaves
+
+        frame = pd.DataFrame({'工号': emp_ids[movers], '姓名': names[movers], '入职日期': hire_dates[movers],
+                              '调动日期': dates})
+        for col, values in zip(BEFORE_ORG_COLUMNS, leaf_org_columns(before_leaves, tree, org_shape)):
+            frame[col] = values
+        for col, values in zip(AFTER_ORG_COLUMNS, leaf_org_columns(after_leaves, tree, org_shape)):
+            frame[col] = values
+        transfer_frames.append(frame)
+    df_transfer = pd.concat(transfer_frames, ignore_index=True) if transfer_frames \
+        else pd.DataFrame(columns=TRANSFER_COLUMNS)
+
+    # 异常工号：调动记录存在但不在在职/离职名单中
+    n_abnormal = int(len(df_transfer) * abnormal_rate)
+    if n_abnormal:
+        abnormal_rows = df_transfer.sample(n_abnormal, random_state=seed).copy()
+        abnormal_rows['工号'] = [f"X{i:07d}" for i in range(n_abnormal)]
+        df_transfer = pd.concat([df_transfer, abnormal_rows], ignore_index=True)
+
+    # 离职：离职日期在入职日期与年末之间，且不早于最后一次调动
+    leaving = rng.random(headcount) < exit_rate
+    leave_start = np.maximum(last_transfer, np.datetime64(f"{year - 1}-01-01", 'D'))
+    leave_gap = (np.datetime64(year_end, 'D') - leave_start).astype(np.int64)
+    leave_dates = leave_start + (rng.random(headcount) * np.maximum(leave_gap, 0)).astype('timedelta64[D]')
+
+    current_orgs = leaf_org_columns(current_leaves, tree, org_shape)
+    df_onboard = pd.DataFrame({'工号': emp_ids[~leaving], '姓名': names[~leaving], '入职日期': hire_dates[~leaving]})
+    for col, values in zip(ORG_COLUMNS, current_orgs):
+        df_onboard[col] = values[~leaving]
+
+    df_resigned = pd.DataFrame({'工号': emp_ids[leaving], '姓名': names[leaving], '入职日期': hire_dates[leaving]})
+    for col, values in zip(RESIGNED_COLUMNS[3:7], current_orgs):
+        df_resigned[col] = values[leaving]
+    df_resigned['最后工作日'] = leave_dates[leaving]
+
+    # 重复记录：在职花名册重复行、调动花名册同一天的重复调动
+    if duplicate_rate:
+        df_onboard = pd.concat([df_onboard, df_onboard.sample(frac=duplicate_rate, random_state=seed)],
+                               ignore_index=True)
+        if len(df_transfer):
+            df_transfer = pd.concat([df_transfer, df_transfer.sample(frac=duplicate_rate, random_state=seed)],
+                                    ignore_index=True)
+
+    df_transfer = df_transfer.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+    # 日期列统一为 datetime64[ns]，与 read_table_columns 读取真实文件的结果一致
+    frames = (df_transfer[TRANSFER_COLUMNS], df_onboard[ONBOARD_COLUMNS], df_resigned[RESIGNED_COLUMNS])
+    for df in frames:
+        for col in DATE_COLUMNS:
+            if col in df.columns:
+                df[col] = df[col].astype('datetime64[ns]')
+    return frames
+
+
+# 模拟经费计算文件：在合并结果上追加“月薪”列
+def generate_fee_input(merged_df, seed=0):
+    rng = np.random.default_rng(seed)
+    fee_df = merged_df.copy()
+    fee_df['月薪'] = np.round(rng.lognormal(10, 0.4, len(fee_df)), -1)
+    return fee_df
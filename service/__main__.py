@@ -0,0 +1,77 @@
+import argparse
+import logging
+import os
+import sys
+
+from service.batch import expand_merge_dirs, expand_input_files, run_jobs, run_merge_job, run_fee_job
+from service.columns import ORG_LEVEL_NAMES
+from service.instrument import configure_logging
+
+
+# 命令行参数
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m service',
+        description='批量处理员工入转调离数据合并与年度经费计算（多进程并行）'
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    merge_parser = subparsers.add_parser(
+        'merge', help='批量合并员工入转调离数据',
+        description='每个输入目录为一个组织，目录中按文件名识别 调动/调转、在职、离职 三份花名册；'
+                    '若目录下没有输入文件，则其每个子目录各为一个组织'
+    )
+    merge_parser.add_argument('inputs', nargs='+', help='组织目录或 glob（例如 "data/2025/*"）')
+    merge_parser.add_argument('--level', type=int, default=1, choices=sorted(ORG_LEVEL_NAMES),
+                              help='统计组织层级，默认 1')
+    merge_parser.add_argument('--all-levels', action='store_true', help='一次计算全部组织层级，输出多 sheet 工作簿')
+    merge_parser.add_argument('--timeline', action='store_true', help='展开完整调动时间线')
+
+    fee_parser = subparsers.add_parser('fee', help='批量计算年度经费')
+    fee_parser.add_argument('inputs', nargs='+', help='员工入转调离数据文件、目录或 glob')
+    fee_parser.add_argument('--year', type=int, required=True, help='核算年度（多年度时为起始年度）')
+    fee_parser.add_argument('--end-year', type=int, help='多年度核算的结束年度')
+    fee_parser.add_argument('--monthly-rate', type=float, default=50.0, help='月度经费标准，默认 50 元')
+    fee_parser.add_argument('--cutoff-day', type=int, default=15, help='半月折算截止日，默认 15')
+
+    for sub in (merge_parser, fee_parser):
+        sub.add_argument('-o', '--output-dir', required=True, help='输出目录（不存在时自动创建）')
+        sub.add_argument('-j', '--workers', type=int, default=None, help='并行进程数，默认为 CPU 核数')
+        sub.add_argument('-v', '--verbose', action='store_true', help='输出各任务的阶段耗时日志')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    configure_logging(logging.INFO if args.verbose else logging.WARNING)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    if args.command == 'merge':
+        job_dirs = expand_merge_dirs(args.inputs)
+        tasks = [
+            (job_dir, run_merge_job, (job_dir, args.level, args.output_dir),
+             {'all_levels': args.all_levels, 'timeline': args.timeline})
+            for job_dir in job_dirs
+        ]
+    else:
+        end_year = args.end_year or args.year
+        if end_year < args.year:
+            print("结束年度不能早于起始年度。", file=sys.stderr)
+            return 2
+        tasks = [
+            (cal_file, run_fee_job, (cal_file, args.year, end_year, args.output_dir),
+             {'monthly_rate': args.monthly_rate, 'cutoff_day': args.cutoff_day})
+            for cal_file in expand_input_files(args.inputs)
+        ]
+
+    if not tasks:
+        print("没有找到需要处理的输入文件。", file=sys.stderr)
+        return 2
+
+    print(f"共 {len(tasks)} 个任务，开始并行处理...")
+    results = run_jobs(tasks, args.workers)
+    return 0 if all(result['ok'] for result in results.values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
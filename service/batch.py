@@ -0,0 +1,179 @@
+import glob
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from service.cal_fee import cal_fee, cal_fee_years, fee_rollup
+from service.columns import ORG_LEVEL_NAMES
+from service.instrument import collect_spans
+from service.merge_info import (
+    read_file, collect_employee_ids, rank_clo,
+    process_employee_data, process_abnormal_employee_data, process_all_levels, all_levels_sheets,
+    save_result_snapshot
+)
+from service.writer import write_excel
+
+
+# 支持的输入文件扩展名（实际格式按文件头识别，见 reader.detect_format）
+INPUT_SUFFIXES = ('.xlsx', '.xls', '.csv', '.parquet')
+
+# 合并任务目录中按文件名关键字识别三份花名册
+ROLE_KEYWORDS = {
+    'transfer': ('调动', '调转'),
+    'onboard': ('在职',),
+    'resigned': ('离职',),
+}
+
+
+# 展开输入：目录展开为其中的输入文件（Excel / CSV / Parquet），其余按 glob 匹配；结果去重并排序
+def expand_input_files(inputs):
+    files = set()
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            files.update(os.path.join(pattern, name) for name in os.listdir(pattern))
+        else:
+            files.update(glob.glob(pattern))
+    return sorted(
+        path for path in files
+        if os.path.isfile(path) and path.lower().endswith(INPUT_SUFFIXES) and not os.path.basename(path).startswith('~$')
+    )
+
+
+# 展开合并任务目录：直接包含输入文件的目录为一个任务，否则其下每个包含输入文件的子目录各为一个任务
+def expand_merge_dirs(inputs):
+    job_dirs = set()
+    for pattern in inputs:
+        for path in glob.glob(pattern) if not os.path.isdir(pattern) else [pattern]:
+            if not os.path.isdir(path):
+                continue
+            if expand_input_files([path]):
+                job_dirs.add(path)
+            else:
+                subdirs = (os.path.join(path, name) for name in os.listdir(path))
+                job_dirs.update(sub for sub in subdirs if os.path.isdir(sub) and expand_input_files([sub]))
+    return sorted(job_dirs)
+
+
+# 按文件名关键字识别目录中的 调转 / 离职 / 在职 花名册（文件名含多个关键字时按此顺序取第一个）
+def classify_merge_files(job_dir):
+    roles = {}
+    for path in expand_input_files([job_dir]):
+        name = os.path.basename(path)
+        for role in ('transfer', 'resigned', 'onboard'):
+            if any(keyword in name for keyword in ROLE_KEYWORDS[role]):
+                if role in roles:
+                    raise ValueError(f"目录 {job_dir} 中有多个{ROLE_KEYWORDS[role][0]}花名册: {roles[role]}, {path}")
+                roles[role] = path
+                break
+    if 'transfer' not in roles:
+        raise ValueError(f"目录 {job_dir} 中没有调转员工花名册（文件名需包含“调动”或“调转”）")
+    return roles
+
+
+# 单个合并任务（在子进程中执行），返回输出文件列表
+def run_merge_job(job_dir, dep_level, output_dir, all_levels=False, timeline=False):
+    roles = classify_merge_files(job_dir)
+    df_tiaodong, df_zai, df_li = read_file(roles['transfer'], roles.get('onboard'), roles.get('resigned'),
+                                           parallel=False)
+    all_employees_set = collect_employee_ids(df_zai, df_li)
+    name = os.path.basename(os.path.normpath(job_dir))
+
+    if all_levels:
+        results = process_all_levels(all_employees_set, df_tiaodong, df_zai, df_li, timeline=timeline)
+        output_file = os.path.join(output_dir, f"{name}_员工入转调离信息汇总表_全部组织层级.xlsx")
+        write_excel(all_levels_sheets(results), output_file)
+        return [output_file]
+
+    level_name = ORG_LEVEL_NAMES[dep_level]
+    employee_df = process_employee_data(dep_level, all_employees_set, df_tiaodong, df_zai, df_li, None,
+                                        timeline=timeline)
+    abnormal_employee_df = process_abnormal_employee_data(dep_level, all_employees_set, df_tiaodong, None,
+                                                          timeline=timeline)
+    output_file = os.path.join(output_dir, f"{name}_员工入转调离信息汇总表_{level_name}.xlsx")
+    abnormal_output_file = os.path.join(output_dir, f"{name}_异常员工入转调离信息汇总表_{level_name}.xlsx")
+    employee_output = rank_clo(employee_df)
+    abnormal_output = rank_clo(abnormal_employee_df)
+    write_excel({'Sheet1': employee_output}, output_file)
+    write_excel({'Sheet1': abnormal_output}, abnormal_output_file)
+    # 导出结果写入快照缓存，作为下次增量合并的上次结果时直接加载
+    save_result_snapshot(output_file, employee_output)
+    save_result_snapshot(abnormal_output_file, abnormal_output)
+    return [output_file, abnormal_output_file]
+
+
+# 单个经费任务（在子进程中执行）：经费明细 + 组织汇总两个 sheet
+def run_fee_job(cal_file, start_year, end_year, output_dir, monthly_rate=50.0, cutoff_day=15):
+    stem = os.path.splitext(os.path.basename(cal_file))[0]
+    if start_year == end_year:
+        df = cal_fee(cal_file, start_year, monthly_rate, cutoff_day)
+        rollup_df = fee_rollup(df)
+        label = f"{start_year}"
+    else:
+        years = list(range(start_year, end_year + 1))
+        df = cal_fee_years(cal_file, years, monthly_rate, cutoff_day)
+        rollup_df = fee_rollup(df, years)
+        label = f"{start_year}-{end_year}"
+
+    output_file = os.path.join(output_dir, f"{stem}_年度经费核算_{label}.xlsx")
+    write_excel({'经费明细': df, '组织汇总': rollup_df}, output_file)
+    return [output_file]
+
+
+# 子进程包装：记录单个任务耗时与各阶段记录，异常转为结果而不是中断整个批次
+def _timed_job(job, *args, **kwargs):
+    start = time.perf_counter()
+    with collect_spans() as spans:
+        try:
+            outputs = job(*args, **kwargs)
+            result = {'ok': True, 'outputs': outputs}
+        except Exception as e:
+            result = {'ok': False, 'error': f"{type(e).__name__}: {e}", 'traceback': traceback.format_exc()}
+    return {**result, 'elapsed': time.perf_counter() - start, 'spans': spans}
+
+
+# 各任务的顶层阶段按名称累计耗时，按耗时从高到低排列
+def stage_totals(results):
+    totals = {}
+    for result in results.values():
+        for record in result.get('spans', ()):
+            if record['depth'] == 0:
+                totals[record['name']] = totals.get(record['name'], 0.0) + record['seconds']
+    return sorted(totals.items(), key=lambda item: -item[1])
+
+
+# 用进程池并行执行任务：tasks 为 [(名称, 任务函数, 参数, 关键字参数)]，按完成顺序打印每个任务的耗时与结果
+def run_jobs(tasks, workers=None):
+    results = {}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(_timed_job, job, *args, **kwargs): name
+            for name, job, args, kwargs in tasks
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # 子进程异常退出（如内存不足被杀）时无法返回结果
+                result = {'ok': False, 'error': f"{type(e).__name__}: {e}", 'traceback': '', 'elapsed': 0.0}
+            results[name] = result
+            if result['ok']:
+                print(f"[完成] {name}，耗时 {result['elapsed']:.2f}s -> {', '.join(result['outputs'])}")
+            else:
+                print(f"[失败] {name}，耗时 {result['elapsed']:.2f}s: {result['error']}")
+
+    failed = {name: result for name, result in results.items() if not result['ok']}
+    print(f"批量处理结束：共 {len(results)} 个任务，成功 {len(results) - len(failed)} 个，"
+          f"失败 {len(failed)} 个，总耗时 {time.perf_counter() - start:.2f}s")
+    for name in sorted(results, key=lambda key: -results[key]['elapsed']):
+        print(f"  {results[name]['elapsed']:8.2f}s  {'成功' if results[name]['ok'] else '失败'}  {name}")
+    totals = stage_totals(results)
+    if totals:
+        print("各阶段累计耗时：")
+        for stage, seconds in totals:
+            print(f"  {seconds:8.2f}s  {stage}")
+    for name, result in failed.items():
+        print(f"\n--- {name} 失败详情 ---\n{result['traceback'] or result['error']}")
+    return results
@@ -1,19 +1,159 @@
 from datetime import date
 from typing import Union
+import numpy as np
 import pandas as pd
 
+from service.columns import FEE_COLUMNS, ORG_COLUMNS
+from service.dates import parse_date, parse_dates
+from service.instrument import logger, span
+from service.reader import read_table_columns
+from service.rollup import org_rollup
+from service.writer import write_excel
+
 
 # 输出文件
 def output_result_file(df_final, output_file):
-    df_output = df_final.copy()
-
-    print(f"数据处理完毕，准备写入文件: {output_file}")
     # --- 6. 保存结果 ---
     try:
-        df_output.to_excel(output_file, index=False, engine='openpyxl')
-        print(f"成功生成汇总表: {output_file}")
+        write_excel({'Sheet1': df_final}, output_file)
+        logger.info(f"成功生成汇总表: {output_file}")
     except Exception as e:
-        print(f"写入文件时出错: {e}")
+        logger.error(f"写入文件时出错: {e}")
+
+
+# 日期列拆分为年/月/日整数数组，缺失值通过 valid 掩码标记（datetime64 直接使用，其余经 dates.parse_dates 解析）
+# 单个 date 直接取年/月/日（单值函数的快速路径，之后与数组走同一套规则）
+def _date_parts(values):
+    if isinstance(values, date):
+        return values.year, values.month, values.day, np.True_
+    values = parse_dates(values).to_numpy(dtype='datetime64[D]')
+    valid = ~np.isnat(values)
+    months = values.astype('datetime64[M]')
+    year = months.astype('datetime64[Y]').astype(np.int64) + 1970
+    month = months.astype(np.int64) % 12 + 1
+    day = (values - months.astype('datetime64[D]')).astype(np.int64) + 1
+    return year, month, day, valid
+
+
+# 入职/调入 月数（数组版，规则同 calculate_in_annual_allowance）
+def _in_allowance_months(hire_parts, target_year, cutoff_day=15):
+    year, month, day, valid = hire_parts
+    same_year_months = np.where(day <= cutoff_day, 1.0, 0.5) + (12 - month)
+    months = np.where(year < target_year, 12.0, np.where(year > target_year, 0.0, same_year_months))
+    return np.where(valid, months, 0.0)
+
+
+# 离职/调离 月数（数组版，规则同 calculate_out_annual_allowance）
+def _out_allowance_months(join_parts, leave_parts, target_year, cutoff_day=15):
+    join_year, join_month, join_day, join_valid = join_parts
+    leave_year, leave_month, leave_day, leave_valid = leave_parts
+
+    # 入职早于统计年度 → 从 1 月 1 日起算
+    join_in_year = join_year == target_year
+    actual_join_month = np.where(join_in_year, join_month, 1)
+
+    join_frac = np.where(join_in_year & (join_day > cutoff_day), 0.5, 1.0)
+    leave_frac = np.where(leave_day < cutoff_day, 0.5, 1.0)
+
+    # 同月：同年入职且 入职<=cutoff、离职>cutoff 记整月，否则半月；跨年入职按离职当月折算
+    same_month = np.where(
+        join_in_year,
+        np.where((join_day <= cutoff_day) & (leave_day > cutoff_day), 1.0, 0.5),
+        leave_frac
+    )
+    # 不同月：首月折算 + 中间完整月 + 末月折算
+    full_months = np.maximum(leave_month - actual_join_month - 1, 0)
+    diff_month = join_frac + full_months + leave_frac
+
+    months = np.where(actual_join_month == leave_month, same_month, diff_month)
+
+    # 同年入职晚于离职 → 0
+    join_after_leave = join_in_year & (
+        (join_month > leave_month) | ((join_month == leave_month) & (join_day > leave_day))
+    )
+    months = np.where(join_after_leave | ~join_valid, 0.0, months)
+
+    months = np.where(leave_year < target_year, 0.0, np.where(leave_year > target_year, 12.0, months))
+    # 入职晚于统计年度 → 0（在离职年份分支之后判断，离职晚于统计年度时也不计全年）
+    months = np.where(join_valid & (join_year > target_year), 0.0, months)
+    return np.where(leave_valid, months, 0.0)
+
+
+def calculate_in_annual_allowance_batch(
+        hire_dates,
+        target_year: int,
+        monthly_rate: float = 50.0,
+        cutoff_day: int = 15
+):
+    """
+    批量计算入职/调入员工在目标年份的月数与年度经费，规则同 calculate_in_annual_allowance。
+
+    参数:
+        hire_dates (array-like or date): 入职/调入日期，支持 datetime64 数组、Series 或日期字符串序列，缺失值计 0；
+            也可以是单个 date（此时返回 0 维数组）。
+        target_year (int): 统计年份。
+        monthly_rate (float): 月度经费标准，默认 50.0 元。
+        cutoff_day (int): 判断首月是否计整月的截止日（含），默认 15。
+
+    返回:
+        tuple[np.ndarray, np.ndarray]: (月数数组, 年度经费数组)
+
+    示例:
+        >>> months, fees = calculate_in_annual_allowance_batch(
+        ...     np.array(['2013-11-21', '2013-02-21', '2015-01-01'], dtype='datetime64[D]'), 2013)
+        >>> months.tolist(), fees.tolist()
+        ([1.5, 10.5, 0.0], [75.0, 525.0, 0.0])
+    """
+    months = _in_allowance_months(_date_parts(hire_dates), target_year, cutoff_day)
+    return months, np.round(months * monthly_rate, 2)
+
+
+def calculate_out_annual_allowance_batch(
+        join_dates,
+        leave_dates,
+        target_year: int,
+        monthly_rate: float = 50.0,
+        cutoff_day: int = 15
+):
+    """
+    批量计算离职/调离员工在目标年份的月数与年度经费，规则同 calculate_out_annual_allowance。
+
+    参数:
+        join_dates (array-like or date): 入职日期，datetime64 数组、Series 或日期字符串序列，或单个 date。
+        leave_dates (array-like or date): 离职或调离日期，与 join_dates 等长（或单个 date），缺失值计 0。
+        target_year (int): 统计年份。
+        monthly_rate (float): 月度经费标准，默认 50.0 元。
+        cutoff_day (int): 折算截止日，默认 15。
+
+    返回:
+        tuple[np.ndarray, np.ndarray]: (月数数组, 年度经费数组)
+
+    示例:
+        >>> months, fees = calculate_out_annual_allowance_batch(
+        ...     pd.Series(pd.to_datetime(['2023-01-01', '2024-02-01'])),
+        ...     pd.Series(pd.to_datetime(['2024-03-01', '2024-05-16'])), 2024)
+        >>> months.tolist(), fees.tolist()
+        ([2.5, 4.0], [125.0, 200.0])
+    """
+    months = _out_allowance_months(_date_parts(join_dates), _date_parts(leave_dates), target_year, cutoff_day)
+    return months, np.round(months * monthly_rate, 2)
+
+
+# 标准化单个日期参数为 date 对象（ISO 字符串直接转换，其余字符串经 dates.parse_date 解析，支持的格式见 dates.DATE_FORMATS）
+def _to_date(value, name):
+    if isinstance(value, str):
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            pass
+        parsed = parse_date(value)
+        if parsed is None:
+            raise ValueError(f"Invalid date format: {value}. Expected a date string such as "
+                             f"YYYY-MM-DD, YYYY/MM/DD, YYYY.MM.DD, YYYY年MM月DD日 or YYYYMMDD.")
+        return parsed
+    elif not isinstance(value, date):
+        raise TypeError(f"{name} must be a date object or a date string (see service.dates.DATE_FORMATS).")
+    return value
 
 
 def calculate_in_annual_allowance(
@@ -41,60 +181,27 @@ def calculate_in_annual_allowance(
         cutoff_day (int): 判断首月是否计整月的截止日（含），默认 15。
 
     返回:
-        float: 应享有的年度经费（保留两位小数，符合财务习惯）。
+        tuple[float, float]: (计算月数, 年度经费)，经费保留两位小数，符合财务习惯。
 
     示例:
         >>> calculate_in_annual_allowance('2013-11-21', 2014)
-        600.0
+        (12.0, 600.0)
         >>> calculate_in_annual_allowance('2013-02-21', 2013)
-        525.0
+        (10.5, 525.0)
         >>> calculate_in_annual_allowance('2013-02-10', 2013)
-        550.0
+        (11.0, 550.0)
         >>> calculate_in_annual_allowance('2015-01-01', 2013)
-        0.0
+        (0.0, 0.0)
     """
-    # 标准化 hire_date 为 date 对象
-    if isinstance(hire_date, str):
-        try:
-            hire_date = date.fromisoformat(hire_date)
-        except ValueError as e:
-            raise ValueError(f"Invalid date format: {hire_date}. Expected YYYY-MM-DD.") from e
-    elif not isinstance(hire_date, date):
-        raise TypeError("hire_date must be a date object or 'YYYY-MM-DD' string.")
-
-    hire_year = hire_date.year
-    hire_month = hire_date.month
-    hire_day = hire_date.day
-
-    # 情况1: 员工在统计年份之后入职 → 0
-    if hire_year > target_year:
-        return 0, 0.0
-
-    # 情况2: 跨年（入职年 < 统计年）→ 全年12个月
-    if hire_year < target_year:
-        return 12, round(12 * monthly_rate, 2)
-
-    # 情况3: 同年（hire_year == target_year）
-    # 判断首月折算
-    if hire_day <= cutoff_day:
-        first_month_factor = 1.0
-    else:
-        first_month_factor = 0.5
-
-    # 剩余完整月份：从 (hire_month + 1) 到 12 月，共 (12 - hire_month) 个月
-    remaining_full_months = 12 - hire_month
-
-    total_months = first_month_factor + remaining_full_months
-
-    # 边界保护：防止因逻辑错误导致负数（理论上不会发生）
-    total_months = max(0.0, total_months)
-
-    return total_months, round(total_months * monthly_rate, 2)
+    months, fees = calculate_in_annual_allowance_batch(
+        _to_date(hire_date, 'hire_date'), target_year, monthly_rate, cutoff_day
+    )
+    return float(months), float(fees)
 
 
 def calculate_out_annual_allowance(
-    join_date: date,
-    leave_date: date,
+    join_date: Union[date, str],
+    leave_date: Union[date, str],
     target_year: int,
     monthly_rate: float = 50.0,
     cutoff_day: int = 15
@@ -115,166 +222,219 @@ def calculate_out_annual_allowance(
            target_year (int): 统计的年度（如 2024）
 
        Returns:
-           float: 年度活动经费（单位：元）
+           tuple[float, float]: (计算月数, 年度活动经费（单位：元）)
 
        Examples:
            >>> calculate_out_annual_allowance(date(2023,1,1), date(2024,3,1), 2024)
-           125.0
+           (2.5, 125.0)
            >>> calculate_out_annual_allowance(date(2024,2,1), date(2024,5,16), 2024)
-           200.0
+           (4.0, 200.0)
            >>> calculate_out_annual_allowance(date(2023,1,1), date(2024,3,1), 2023)
-           600.0
+           (12.0, 600.0)
+           >>> calculate_out_annual_allowance(date(2025,3,1), date(2025,6,10), 2023)
+           (0.0, 0.0)
+           >>> calculate_out_annual_allowance(date(2025,3,1), date(2026,6,10), 2024)
+           (0.0, 0.0)
        """
-    if leave_date.year < target_year:
-        return 0.0, 0.0
+    months, fees = calculate_out_annual_allowance_batch(
+        _to_date(join_date, 'join_date'), _to_date(leave_date, 'leave_date'), target_year, monthly_rate, cutoff_day
+    )
+    return float(months), float(fees)
 
-    if leave_date.year > target_year:
-        return 12.0, round(12 * monthly_rate, 2)
 
-    # Only consider target_year
-    year_start = date(target_year, 1, 1)
-    year_end = date(target_year, 12, 31)
+# 经费计算使用的日期列
+FEE_DATE_COLUMNS = ['入职日期', '离职日期', '调离日期', '调入日期']
 
-    # Actual period in target_year
-    actual_join = max(join_date, year_start)
-    actual_leave = min(leave_date, year_end)
 
-    if actual_join > actual_leave:
-        return 0.0, 0.0
+# 两组日期拆分结果按行合并：primary 有值取 primary，否则取 fallback
+def _coalesce_parts(primary, fallback):
+    valid = primary[3]
+    return tuple(np.where(valid, p, f) for p, f in zip(primary, fallback))
 
-    join_month = actual_join.month
-    leave_month = actual_leave.month
 
-    # --- Calculate fraction for join month (only if joined in target_year)
-    if join_date.year == target_year:
-        if actual_join.day <= cutoff_day:
-            join_frac = 1.0
-        else:
-            join_frac = 0.5
+# 行按员工分组、组内按区段起点排序：返回 (排序下标, 与上一行属于同一员工的掩码)。
+# 工号为空的行各自视为一名员工；起点缺失的区段排在该员工最后
+def _employee_stint_order(dep_data_df, stint_start):
+    if '工号' in dep_data_df.columns:
+        ids, _ = pd.factorize(dep_data_df['工号'])
     else:
-        # Joined before target_year → January is full month
-        join_frac = 1.0
+        ids = np.full(len(dep_data_df), -1)
+    missing = ids < 0
+    ids = np.where(missing, ids.max(initial=-1) + 1 + np.cumsum(missing), ids)
+
+    # 排序键：员工序号 × 10^8 + 起点 YYYYMMDD（起点缺失记为 99999999），稳定排序保持同一起点的行序
+    year, month, day, valid = stint_start
+    start_key = np.where(valid, year * 10000 + month * 100 + day, 99999999)
+    order = np.argsort(ids.astype(np.int64) * 100000000 + start_key, kind='stable')
+    sorted_ids = ids[order]
+    same_employee = np.zeros(len(ids), dtype=bool)
+    same_employee[1:] = sorted_ids[1:] == sorted_ids[:-1]
+    return order, same_employee
+
+
+# 同一员工多个区段共用的月份（如调转当月）超出 1 个月的部分，按区段返回应扣除的月数。
+# 每个区段的首月、末月各计入若干月（折算同 _in/_out_allowance_months，起止同月的区段只计一次），
+# 按 员工 × 年月 分组、组内按区段顺序累计，超过 1 个月的部分从靠后的区段扣除。
+# 各数组已按 _employee_stint_order 排序，employee 为员工序号
+def _shared_month_excess(stint_start, stint_end, months, target_year, employee, cutoff_day=15):
+    start_year, start_month, start_day, start_valid = stint_start
+    end_year, end_month, end_day, end_valid = stint_end
+    start_in_year = start_valid & (start_year == target_year)
+    end_in_year = end_valid & (end_year == target_year)
+    single_month = start_in_year & end_in_year & (start_month == end_month)
+
+    first = np.where(start_in_year, np.where(single_month, months, np.where(start_day <= cutoff_day, 1.0, 0.5)), 0.0)
+    last = np.where(end_in_year & ~single_month, np.where(end_day < cutoff_day, 0.5, 1.0), 0.0)
+
+    # 事件：每个区段的首月、末月交替排列（即按区段顺序），再按 员工、年月 稳定排序
+    n = len(employee)
+    shares = np.stack([np.minimum(first, months), np.minimum(last, months)], axis=1).reshape((2 * n,) + months.shape[1:])
+    year_month = np.stack([
+        np.ravel(np.where(start_valid, start_year * 12 + start_month, 0)),
+        np.ravel(np.where(end_valid, end_year * 12 + end_month, 0)),
+    ], axis=1).ravel()
+    event_key = np.repeat(employee.astype(np.int64), 2) * 1000000 + year_month
+    order = np.argsort(event_key, kind='stable')
+    shares = shares[order]
+    group_start = np.ones(2 * n, dtype=bool)
+    group_start[1:] = event_key[order][1:] != event_key[order][:-1]
+
+    before = np.cumsum(shares, axis=0) - shares
+    before = before - before[np.flatnonzero(group_start)][np.cumsum(group_start) - 1]
+    excess = np.empty_like(shares)
+    excess[order] = shares - np.clip(np.minimum(shares, 1.0 - before), 0.0, None)
+    return excess.reshape((n, 2) + months.shape[1:]).sum(axis=1)
+
+
+def compute_fee_months(dep_data_df, target_years, cutoff_day=15):
+    """
+    区段引擎：每行视为员工在本组织的一段任职区段，按区段计算计算月数，再按员工合并各区段。
 
-    # --- Calculate fraction for leave month (always in target_year here)
-    if actual_leave.day < cutoff_day:
-        leave_frac = 0.5
-    else:
-        leave_frac = 1.0
-
-    # --- Handle same month
-    if join_month == leave_month:
-        # Only one month
-        if join_date.year == target_year and leave_date.year == target_year:
-            # Both in same year and same month
-            if actual_join.day <= cutoff_day and actual_leave.day > cutoff_day:
-                total_months = 1.0
-            else:
-                total_months = 0.5
+    - 起点 = 调入日期（无则入职日期），终点 = 调离日期（无则离职日期）；
+      无终点 → 按入职/调入规则；有终点 → 按离职/调离规则（起点视为入职日期）。
+      在职 / 调入 / 离职 / 调离 四种单条记录情况与原规则完全一致。
+    - 同一工号的多条记录（跨组织调转前/后、完整时间线区段，以及同时存在调入和调离的记录）按起点排序：
+      多个区段落在同一月（如调转当月）时，该月各区段合计最多 1 个月（超出部分从靠后的区段扣除）。
+    - 每名员工每个年度合计最多 12 个月（按区段顺序，超出部分从靠后的区段扣除）。
+
+    参数:
+        dep_data_df (DataFrame): 含 工号 与 入职/离职/调离/调入日期 列，缺失的日期列按全空处理。
+        target_years (int or array-like): 单个年度，或年度数组（按 记录 × 年度 网格广播）。
+        cutoff_day (int): 折算截止日，默认 15。
+
+    返回:
+        np.ndarray: 单个年度时形状为 (记录数,)；年度数组时为 (记录数, 年度数)。
+
+    示例（6 月中跨组织调转一次，调转前后各一行，全年合计 12 个月）:
+        >>> df = pd.DataFrame({
+        ...     '工号': ['001', '001', '002', '002', '003', '003'],
+        ...     '入职日期': pd.to_datetime(['2020-03-01'] * 6),
+        ...     '调离日期': pd.to_datetime(['2024-06-10', None, '2024-06-15', None, '2024-06-20', None]),
+        ...     '调入日期': pd.to_datetime([None, '2024-06-10', None, '2024-06-15', None, '2024-06-20']),
+        ... })
+        >>> compute_fee_months(df, 2024).tolist()
+        [5.5, 6.5, 6.0, 6.0, 6.0, 6.0]
+        >>> compute_fee_months(df, np.array([2023, 2024])).sum(axis=0).tolist()
+        [36.0, 36.0]
+
+    示例（起点晚于统计年度的区段计 0 个月，即使终点落在更晚的年度）:
+        >>> later = pd.DataFrame({
+        ...     '工号': ['004', '005'],
+        ...     '入职日期': pd.to_datetime(['2020-03-01', '2025-03-01']),
+        ...     '离职日期': pd.to_datetime([None, '2025-06-10']),
+        ...     '调离日期': pd.to_datetime(['2026-01-09', None]),
+        ...     '调入日期': pd.to_datetime(['2025-10-25', None]),
+        ... })
+        >>> compute_fee_months(later, 2024).tolist()
+        [0.0, 0.0]
+        >>> compute_fee_months(later, np.array([2023, 2024, 2025, 2026]))[1].tolist()
+        [0.0, 0.0, 3.5, 0.0]
+    """
+    years = np.asarray(target_years)
+    # 日期列拆分为年/月/日数组，缺失列按全空处理
+    parts = {}
+    for col in FEE_DATE_COLUMNS:
+        if col in dep_data_df.columns:
+            values = dep_data_df[col]
         else:
-            # Joined before target_year, so this month is full if leave after 15th
-            total_months = leave_frac
-    else:
-        # Different months
-        # Full months between join and leave (excluding both)
-        full_months = leave_month - join_month - 1
-        if full_months < 0:
-            full_months = 0
+            values = pd.Series(pd.NaT, index=dep_data_df.index)
+        parts[col] = _date_parts(values)
+
+    stint_start = _coalesce_parts(parts['调入日期'], parts['入职日期'])
+    stint_end = _coalesce_parts(parts['调离日期'], parts['离职日期'])
+
+    # 按员工、区段起点排序后计算；多年度时为记录维度追加一个轴
+    order, same_employee = _employee_stint_order(dep_data_df, stint_start)
+    first_rows = np.flatnonzero(~same_employee)
+    employee = np.cumsum(~same_employee) - 1
+    stint_start = tuple(arr[order][:, None] if years.ndim else arr[order] for arr in stint_start)
+    stint_end = tuple(arr[order][:, None] if years.ndim else arr[order] for arr in stint_end)
 
-        total_months = join_frac + full_months + leave_frac
+    months = np.where(
+        stint_end[3],
+        _out_allowance_months(stint_start, stint_end, years, cutoff_day),
+        _in_allowance_months(stint_start, years, cutoff_day)
+    )
 
-    total_months = max(0.0, total_months)
-    allowance = round(total_months * monthly_rate, 2)
-    return total_months, allowance
+    # 同一员工多个区段共用的月份（调转当月）合计最多 1 个月
+    months = months - _shared_month_excess(stint_start, stint_end, months, years, employee, cutoff_day)
+
+    # 每名员工每年最多 12 个月：按区段顺序累计，超出部分从靠后的区段扣除
+    before = np.cumsum(months, axis=0) - months
+    before = before - before[first_rows][employee]
+    months = np.clip(np.minimum(months, 12.0 - before), 0.0, None)
+
+    result = np.empty_like(months)
+    result[order] = months
+    return result
 
 
 # 计算部门经费
-def cal_fee(cal_file, target_year):
-    print(f"开始计算组织{target_year}经费")
-    dep_data_df = pd.read_excel(cal_file)
-    # 确保日期列是datetime类型
-    date_cols = ['入职日期', '离职日期', '调离日期', '调入日期']
-    for col in date_cols:
-        if col in dep_data_df.columns:
-            dep_data_df[col] = pd.to_datetime(dep_data_df[col], errors='coerce').dt.date
-
-    # 初始化结果列
-    dep_data_df['计算月数'] = 0.0
-    dep_data_df['年度经费'] = 0.0
-
-    # 频繁调度少数场景计算
-    # 同时存在调入/调出情况，人工计算（需要结合入职时间计算）
-    # 同时存在离职/调转情况，人工计算
-
-    duplicated_mask = dep_data_df.duplicated(subset=['工号'], keep=False)  # keep=False 表示所有重复行都标记为 True
-
-    print(f"开始遍历员工信息")
-    for idx, row in dep_data_df.iterrows():
-        # TODO 排除员工有多条记录的情况，人工计算
-        is_dup = duplicated_mask.loc[idx]
-        if is_dup:
-            continue
-
-        hire_date = row['入职日期']
-        leave_date = row['离职日期']
-        transfer_out_date = row['调离日期']
-        transfer_in_date = row['调入日期']
-
-        # 在职/调入 人员计算
-        if hire_date and (leave_date is None or leave_date == '' or pd.isna(leave_date)) \
-                and (transfer_out_date is None or transfer_out_date == '' or pd.isna(transfer_out_date)) \
-                and (transfer_in_date is None or transfer_in_date == '' or pd.isna(transfer_in_date)):
-            total_months, fee = calculate_in_annual_allowance(hire_date, target_year)
-
-            dep_data_df.at[idx, '计算月数'] = total_months
-            dep_data_df.at[idx, '年度经费'] = fee
-            continue
-
-        if hire_date and transfer_in_date \
-                and (leave_date is None or leave_date == '' or pd.isna(leave_date)) \
-                and (transfer_out_date is None or transfer_out_date == '' or pd.isna(transfer_out_date)):
-            total_months, fee = calculate_in_annual_allowance(transfer_in_date, target_year)
-
-            dep_data_df.at[idx, '计算月数'] = total_months
-            dep_data_df.at[idx, '年度经费'] = fee
-            continue
-
-        # 离职/调入 人员计算
-        if hire_date and leave_date \
-                and (transfer_out_date is None or transfer_out_date == '' or pd.isna(transfer_out_date)) \
-                and (transfer_in_date is None or transfer_in_date == '' or pd.isna(transfer_in_date)):
-            total_months, fee = calculate_out_annual_allowance(hire_date, leave_date, target_year)
-
-            dep_data_df.at[idx, '计算月数'] = total_months
-            dep_data_df.at[idx, '年度经费'] = fee
-            continue
-
-        if hire_date and transfer_out_date \
-                and (leave_date is None or leave_date == '' or pd.isna(leave_date)) \
-                and (transfer_in_date is None or transfer_in_date == '' or pd.isna(transfer_in_date)):
-            total_months, fee = calculate_out_annual_allowance(hire_date, transfer_out_date, target_year)
-
-            dep_data_df.at[idx, '计算月数'] = total_months
-            dep_data_df.at[idx, '年度经费'] = fee
-            continue
-
-    print(f"组织计费计算完成，一共{len(dep_data_df)}")
-    return dep_data_df
+def cal_fee(cal_file, target_year, monthly_rate=50.0, cutoff_day=15):
+    with span('读取文件') as record:
+        dep_data_df = read_table_columns(cal_file, FEE_COLUMNS)
+        record['rows'] = len(dep_data_df)
 
+    with span('计算经费', rows=len(dep_data_df), year=target_year):
+        total_months = compute_fee_months(dep_data_df, target_year, cutoff_day)
+
+        dep_data_df['计算月数'] = total_months
+        dep_data_df['年度经费'] = np.round(total_months * monthly_rate, 2)
+    return dep_data_df
 
-if __name__ == '__main__':
-    # print(calculate_out_annual_allowance(date(2023,1,1), date(2024,3,1), 2024))
-    # print(calculate_out_annual_allowance(date(2024,2,1), date(2024,5,16), 2024))
-    # print(calculate_out_annual_allowance(date(2024,5,10), date(2024,9,16), 2024))
-    # print(calculate_out_annual_allowance(date(2024, 5, 16), date(2024, 9, 10), 2024))
-    # print(calculate_out_annual_allowance(date(2024, 5, 10), date(2024, 9, 10), 2024))
-    #
-    # print(calculate_out_annual_allowance(date(2023,1,1), date(2024,3,1), 2023))
 
-    CAL_FILE = "/Users/shengjiang.zw/Desktop/cal_file_2.xlsx"
+# 多年度经费计算：文件只解析一次，按 员工 × 年度 网格一次算出各年度月数与经费（宽表）
+def cal_fee_years(cal_file, target_years, monthly_rate=50.0, cutoff_day=15):
+    target_years = sorted({int(year) for year in target_years})
+    with span('读取文件') as record:
+        dep_data_df = read_table_columns(cal_file, FEE_COLUMNS)
+        record['rows'] = len(dep_data_df)
 
-    OUT_CAL_FILE = "/Users/shengjiang.zw/PycharmProjects/pythonProject/custom_eval/zhao/file/result.xlsx"
+    with span('计算经费', rows=len(dep_data_df), years=f"{target_years[0]}-{target_years[-1]}"):
+        total_months = compute_fee_months(dep_data_df, np.array(target_years), cutoff_day)
+        fees = np.round(total_months * monthly_rate, 2)
 
-    result = cal_fee(CAL_FILE, 2025)
+        year_columns = {}
+        for i, year in enumerate(target_years):
+            year_columns[f'{year}计算月数'] = total_months[:, i]
+            year_columns[f'{year}年度经费'] = fees[:, i]
+        dep_data_df = pd.concat([dep_data_df, pd.DataFrame(year_columns, index=dep_data_df.index)], axis=1)
+    return dep_data_df
 
-    output_result_file(result, OUT_CAL_FILE)
 
+# 经费组织汇总：按 合计 / 一级 ~ 四级组织 汇总人数、计算月数与年度经费；
+# 传入 target_years 时按 cal_fee_years 的宽表列逐年度汇总
+def fee_rollup(dep_data_df, target_years=None):
+    with span('组织汇总', rows=len(dep_data_df)):
+        if target_years is None:
+            return org_rollup(dep_data_df, ['计算月数', '年度经费'], {'人数': '计算月数'})
+
+        sum_columns = []
+        headcount_columns = {}
+        year_columns = []
+        for year in sorted({int(year) for year in target_years}):
+            headcount_columns[f'{year}人数'] = f'{year}计算月数'
+            sum_columns += [f'{year}计算月数', f'{year}年度经费']
+            year_columns += [f'{year}人数', f'{year}计算月数', f'{year}年度经费']
+        rollup_df = org_rollup(dep_data_df, sum_columns, headcount_columns)
+        return rollup_df[['汇总层级'] + ORG_COLUMNS + year_columns]
@@ -0,0 +1,30 @@
+# 各花名册使用到的列定义（读取时按列裁剪）
+
+# 组织列：统计口径列 / 调动前列 / 调动后列（按层级一一对应）
+ORG_COLUMNS = ['一级组织', '二级组织', '三级组织', '四级组织']
+BEFORE_ORG_COLUMNS = ['调动前一级组织', '调动前二级组织', '调动前三级组织', '调动前部门']
+AFTER_ORG_COLUMNS = ['调动后一级组织', '调动后二级组织', '调动后三级组织', '调动后部门']
+
+# 组织层级编号与名称
+ORG_LEVEL_NAMES = {1: '一级组织', 2: '二级组织', 3: '三级组织', 4: '四级组织'}
+
+# 日期列（读取时统一解析为 datetime）
+DATE_COLUMNS = ['入职日期', '离职日期', '调离日期', '调入日期', '调动日期', '最后工作日']
+
+# 调动花名册
+TRANSFER_COLUMNS = ['工号', '姓名', '入职日期', '调动日期'] + BEFORE_ORG_COLUMNS + AFTER_ORG_COLUMNS
+
+# 在职花名册
+ONBOARD_COLUMNS = ['工号', '姓名', '入职日期'] + ORG_COLUMNS
+
+# 离职花名册（“部门”、“最后工作日”在读取后改名为“四级组织”、“离职日期”）
+RESIGNED_COLUMNS = ['工号', '姓名', '入职日期', '一级组织', '二级组织', '三级组织', '部门', '最后工作日']
+
+# 合并结果（rank_clo 输出列）
+MERGED_COLUMNS = [
+    '姓名', '工号', '一级组织', '二级组织', '三级组织', '四级组织',
+    '入职日期', '离职日期', '调离日期', '调入日期', '跨组织调转'
+]
+
+# 经费计算文件（即合并结果，另保留“月薪”列）
+FEE_COLUMNS = MERGED_COLUMNS + ['月薪']
@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+
+from service.columns import ORG_COLUMNS, BEFORE_ORG_COLUMNS, AFTER_ORG_COLUMNS, DATE_COLUMNS
+from service.dates import parse_dates
+
+
+# 紧凑表示：同一组内的列共用一个字典（分类类型），每个单元格只保存整数编码
+#   组织列（统计口径 / 调动前 / 调动后，以及离职表改名前的“部门”）共用一个组织字典，
+#   工号（编码即整数键）、姓名、跨组织调转各自一个字典
+# 字符串对象只在导出 Excel 时按批生成（见 writer._iter_rows）
+DICTIONARY_GROUPS = [
+    ORG_COLUMNS + BEFORE_ORG_COLUMNS + AFTER_ORG_COLUMNS + ['部门'],
+    ['工号'],
+    ['姓名'],
+    ['跨组织调转'],
+]
+
+
+# 多列取值合并为有序字典：分类列直接取其字典，其余列取非空唯一值；
+# 字典排序后分类编码的顺序与原字符串排序一致（排序、汇总结果不变），混合类型时按字符串排序
+def _dictionary(columns):
+    values = [
+        np.asarray(col.cat.categories, dtype=object) if isinstance(col.dtype, pd.CategoricalDtype)
+        else pd.unique(col.dropna().to_numpy(dtype=object))
+        for col in columns
+    ]
+    uniques = pd.unique(np.concatenate(values)) if values else np.array([], dtype=object)
+    try:
+        uniques = np.sort(uniques)
+    except TypeError:
+        uniques = np.array(sorted(uniques, key=str), dtype=object)
+    return pd.CategoricalDtype(pd.Index(uniques, dtype=object))
+
+
+# 把多个 DataFrame 转为紧凑表示，同名列组在所有 DataFrame 间共用同一个字典，
+# 这样跨表的比较、合并、拼接都直接基于相同的分类类型进行；日期列统一为 datetime64[ns]
+def compact_frames(*frames):
+    dtypes = {}
+    for group in DICTIONARY_GROUPS:
+        columns = [df[col] for df in frames for col in group if col in df.columns]
+        if columns:
+            dtype = _dictionary(columns)
+            dtypes.update({col: dtype for col in group})
+
+    results = []
+    for df in frames:
+        conversions = {col: dtypes[col] for col in df.columns if col in dtypes and df[col].dtype != dtypes[col]}
+        if conversions:
+            df = df.astype(conversions)
+        dates = {
+            col: parse_dates(df[col], col)
+            for col in DATE_COLUMNS if col in df.columns and df[col].dtype != 'datetime64[ns]'
+        }
+        if dates:
+            df = df.assign(**dates)
+        results.append(df)
+    return results
+
+
+# 单个 DataFrame 的紧凑表示
+def compact_frame(df):
+    return compact_frames(df)[0]
+
+
+# DataFrame 内存占用（MB）：(数据, 字典)。数据为编码、数值、日期以及未编码的字符串对象；
+# 字典去重计算（多列、多个 DataFrame 共用同一字典时只算一次）：共用的字典通常是同一个对象，
+# 先按对象去重，再按内容比较剩下的少数字典，避免逐列哈希、扫描整个字典
+def frame_memory_mb(*frames):
+    data = 0
+    dictionaries = {}
+    for df in frames:
+        data += df.index.memory_usage(deep=True)
+        for col in df.columns:
+            values = df[col]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                data += values.cat.codes.to_numpy().nbytes
+                dictionaries.setdefault(id(values.cat.categories), values.cat.categories)
+            else:
+                data += values.memory_usage(index=False, deep=True)
+
+    unique = []
+    for categories in dictionaries.values():
+        if not any(len(categories) == len(other) and categories.equals(other) for other in unique):
+            unique.append(categories)
+    return data / 2 ** 20, sum(categories.memory_usage(deep=True) for categories in unique) / 2 ** 20
+
+
+def _memory_row(name, frames):
+    data_mb, dictionary_mb = frame_memory_mb(*frames)
+    return {
+        '数据表': name,
+        '行数': sum(len(df) for df in frames),
+        '列数': max((len(df.columns) for df in frames), default=0),
+        '分类列数': max((sum(isinstance(dtype, pd.CategoricalDtype) for dtype in df.dtypes) for df in frames), default=0),
+        '数据(MB)': round(data_mb, 2),
+        '字典(MB)': round(dictionary_mb, 2),
+        '内存(MB)': round(data_mb + dictionary_mb, 2),
+    }
+
+
+# 各 DataFrame 的内存报告：frames 为 {名称: DataFrame}，返回表格行；
+# 多个 DataFrame 时追加合计行（共用的字典只计一次）
+def memory_report(frames):
+    rows = [_memory_row(name, [df]) for name, df in frames.items()]
+    if len(frames) > 1:
+        rows.append(_memory_row('合计', list(frames.values())))
+    return rows
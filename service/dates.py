@@ -0,0 +1,181 @@
+from datetime import date
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from service.columns import DATE_COLUMNS
+
+
+# 支持的日期文本格式（年份在前；strptime 允许月、日不补 0）
+DATE_FORMATS = (
+    '%Y-%m-%d',
+    '%Y/%m/%d',
+    '%Y.%m.%d',
+    '%Y年%m月%d日',
+    '%Y%m%d',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y/%m/%d %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y/%m/%d %H:%M',
+)
+# 识别格式时抽样的不同取值个数
+FORMAT_SAMPLE_SIZE = 100
+
+# Excel 日期序列号：以 1899-12-30 为 0，有效范围 1900-01-01 ~ 9999-12-31；
+# 8 位整数（19000101 ~ 99991231）按 YYYYMMDD 解析
+EXCEL_SERIAL_ORIGIN = '1899-12-30'
+EXCEL_SERIAL_RANGE = (1, 2958466)
+YYYYMMDD_RANGE = (19000101, 99991231)
+
+# 各列上次识别出的文本格式：同一列再次解析时先用缓存的格式，整列都能解析时省去抽样识别
+_format_cache = {}
+
+
+def _empty_dates(size):
+    return np.full(size, np.datetime64('NaT'), dtype='datetime64[ns]')
+
+
+# 数值（Excel 序列号或 YYYYMMDD 整数）转为日期，其余数值为 NaT
+def _from_numbers(numbers):
+    result = _empty_dates(len(numbers))
+    serial = (numbers >= EXCEL_SERIAL_RANGE[0]) & (numbers < EXCEL_SERIAL_RANGE[1])
+    if serial.any():
+        result[serial] = pd.to_datetime(numbers[serial], unit='D', origin=EXCEL_SERIAL_ORIGIN).to_numpy('datetime64[ns]')
+    compact = (numbers >= YYYYMMDD_RANGE[0]) & (numbers <= YYYYMMDD_RANGE[1]) & (numbers == np.floor(numbers))
+    if compact.any():
+        text = numbers[compact].astype(np.int64).astype(str)
+        result[compact] = pd.to_datetime(text, format='%Y%m%d', errors='coerce').to_numpy('datetime64[ns]')
+    return result
+
+
+# 识别文本的主要格式：缓存的格式能解析全部样本时直接使用，否则取能解析最多样本的格式
+def detect_date_format(texts, column=None):
+    sample = texts[:FORMAT_SAMPLE_SIZE]
+    if not len(sample):
+        return None
+    cached = _format_cache.get(column)
+    if cached is not None and pd.to_datetime(sample, format=cached, errors='coerce').notna().all():
+        return cached
+
+    best, best_count = None, 0
+    for fmt in DATE_FORMATS:
+        count = pd.to_datetime(sample, format=fmt, errors='coerce').notna().sum()
+        if count > best_count:
+            best, best_count = fmt, count
+            if count == len(sample):
+                break
+    if best is not None and column is not None:
+        _format_cache[column] = best
+    return best
+
+
+# 文本转为日期：先按识别出的主要格式整批解析，剩余文本再依次尝试其他格式（每种格式一次向量化解析）
+def _from_texts(texts, column=None):
+    result = _empty_dates(len(texts))
+    formats = []
+    primary = detect_date_format(texts, column)
+    remaining = np.ones(len(texts), dtype=bool)
+    for fmt in ([primary] if primary else []) + [fmt for fmt in DATE_FORMATS if fmt != primary]:
+        parsed = pd.to_datetime(texts[remaining], format=fmt, errors='coerce').to_numpy('datetime64[ns]')
+        ok = ~np.isnat(parsed)
+        if ok.any():
+            index = np.flatnonzero(remaining)[ok]
+            result[index] = parsed[ok]
+            remaining[index] = False
+            formats.append(fmt)
+        if not remaining.any():
+            break
+    return result, formats
+
+
+# 解析一组（去重后的）原始取值：日期对象直接转换，数值单元格按 Excel 序列号 / YYYYMMDD，其余按文本格式。
+# 纯数字文本不按序列号解析，只接受 8 位 YYYYMMDD（'2024'、'45000' 等视为无法解析）
+# 返回 (datetime64[ns] 数组, 使用到的格式列表)
+def _parse_values(values, column=None):
+    result = _empty_dates(len(values))
+    formats = []
+
+    is_date = np.fromiter((isinstance(v, (date, np.datetime64)) for v in values), dtype=bool, count=len(values))
+    if is_date.any():
+        result[is_date] = pd.to_datetime(values[is_date], errors='coerce').to_numpy('datetime64[ns]')
+        formats.append('日期')
+
+    is_number = np.fromiter(
+        (isinstance(v, (int, float, np.integer, np.floating)) and not isinstance(v, (bool, np.bool_)) for v in values),
+        dtype=bool, count=len(values)
+    )
+    if is_number.any():
+        result[is_number] = _from_numbers(values[is_number].astype(float))
+        formats.append('Excel 序列号')
+
+    texts = np.array([str(v).strip() for v in values], dtype=object)
+    is_text = ~is_date & ~is_number & np.fromiter(
+        (not (text.isdigit() and len(text) != 8) for text in texts), dtype=bool, count=len(texts)
+    )
+    if is_text.any():
+        parsed, text_formats = _from_texts(texts[is_text], column)
+        result[is_text] = parsed
+        formats.extend(text_formats)
+    return result, formats
+
+
+# 日期列解析为 datetime64[ns]，返回 (结果 Series, 使用到的格式列表, 无法解析的掩码)。
+# 已是 datetime64 的列直接返回；数值列按 Excel 序列号；其余只解析不同的取值（分类列即其字典），再按编码取回
+def _parse_dates(values, column=None):
+    series = values if isinstance(values, pd.Series) else pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        if getattr(series.dtype, 'tz', None) is not None:
+            series = series.dt.tz_localize(None)
+        return series.astype('datetime64[ns]'), [], np.zeros(len(series), dtype=bool)
+
+    if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+        numbers = series.to_numpy(dtype=float, na_value=np.nan)
+        result = _from_numbers(numbers)
+        bad = ~np.isnan(numbers) & np.isnat(result)
+        return pd.Series(result, index=series.index, name=series.name), ['Excel 序列号'], bad
+
+    codes, uniques = pd.factorize(series)
+    uniques = np.asarray(uniques, dtype=object)
+    # 空白文本视为空值，不算作无法解析
+    blank = np.fromiter((isinstance(v, str) and not v.strip() for v in uniques), dtype=bool, count=len(uniques))
+    parsed, formats = _parse_values(uniques, column)
+    unique_bad = np.isnat(parsed) & ~blank
+
+    result = np.where(codes >= 0, parsed[codes], np.datetime64('NaT'))
+    bad = (codes >= 0) & unique_bad[codes]
+    return pd.Series(result, index=series.index, name=series.name, dtype='datetime64[ns]'), formats, bad
+
+
+# 日期解析为 datetime64[ns]（Series 保留索引；数组、列表返回 Series），无法解析的值为 NaT
+# column 为列名时，识别出的文本格式按列名缓存，同一列下次解析先尝试该格式
+def parse_dates(values, column=None):
+    return _parse_dates(values, column)[0]
+
+
+# 单个日期解析为 date，无法解析时为 None（结果按取值缓存）
+@lru_cache(maxsize=4096)
+def parse_date(value):
+    parsed = _parse_values(np.array([value], dtype=object))[0][0]
+    return None if np.isnat(parsed) else parsed.astype('datetime64[D]').item()
+
+
+# 标准化 DataFrame 中的日期列：每列识别一次格式、整列向量化解析为 datetime64[ns]。
+# 返回 (新 DataFrame, 报告)；报告每列一行：列、格式（使用到的格式）、无法解析（个数）、示例（前几个无法解析的原始值）
+def normalize_dates(df, columns=DATE_COLUMNS, samples=5):
+    parsed = {}
+    report = []
+    for col in columns:
+        if col not in df.columns:
+            continue
+        values, formats, bad = _parse_dates(df[col], col)
+        parsed[col] = values
+        report.append({
+            '列': col,
+            '格式': '、'.join(formats) or '日期',
+            '无法解析': int(bad.sum()),
+            '示例': list(pd.unique(df[col].to_numpy(dtype=object)[bad]))[:samples],
+        })
+    if parsed:
+        df = df.assign(**parsed)
+    return df, report
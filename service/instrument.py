@@ -0,0 +1,132 @@
+import contextvars
+import itertools
+import logging
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+logger = logging.getLogger('hr_tool')
+
+# 当前运行收集到的阶段记录列表（未开启收集时为 None），以及正在执行的阶段栈
+_collected_spans = contextvars.ContextVar('hr_tool_spans', default=None)
+_open_spans = contextvars.ContextVar('hr_tool_open_spans', default=())
+# 阶段开始顺序（收集列表按结束顺序追加，展示时按开始顺序排列）
+_span_order = itertools.count()
+# 阶段监听：span 开始 / 结束时回调 listener(event, record)，event 为 'start' 或 'end'
+_stage_listener = contextvars.ContextVar('hr_tool_stage_listener', default=None)
+
+
+# 是否记录内存峰值：HR_TOOL_TRACE_MEMORY=1 时开启（tracemalloc 会拖慢纯 Python 部分）
+def trace_memory_enabled():
+    return os.environ.get('HR_TOOL_TRACE_MEMORY', '0') not in ('', '0', 'false', 'False')
+
+
+# 命令行 / UI 入口统一的日志格式（已有 handler 时不重复配置）
+def configure_logging(level=logging.INFO):
+    if not logging.getLogger().handlers:
+        logging.basicConfig(level=level, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    logger.setLevel(level)
+
+
+# 收集一次运行中的所有阶段记录：with collect_spans() as spans: ...，结束后 spans 为记录列表
+# trace_memory 为 None 时按环境变量决定是否开启 tracemalloc
+@contextmanager
+def collect_spans(trace_memory=None):
+    if trace_memory is None:
+        trace_memory = trace_memory_enabled()
+    started = trace_memory and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+
+    spans = []
+    token = _collected_spans.set(spans)
+    try:
+        yield spans
+    finally:
+        _collected_spans.reset(token)
+        if started:
+            tracemalloc.stop()
+
+
+# 在当前上下文中监听阶段开始 / 结束（后台任务据此汇报进度；listener 在 'start' 时抛出异常即可在阶段之间中止计算）
+@contextmanager
+def watch_stages(listener):
+    token = _stage_listener.set(listener)
+    try:
+        yield
+    finally:
+        _stage_listener.reset(token)
+
+
+# 阶段计时：记录耗时、行数与内存峰值（tracemalloc 开启时），结束时写日志并加入当前收集列表。
+# 可在 with 块中设置 record['rows'] 或其他字段；嵌套阶段的峰值会向外层传递
+# tracemalloc 统计整个进程：多个任务同时运行时，峰值包含其他线程的分配（且会被其他阶段重置），只能作为近似值
+@contextmanager
+def span(name, rows=None, **fields):
+    parents = _open_spans.get()
+    record = {'name': name, 'depth': len(parents), 'rows': rows, 'seconds': None, 'peak_mb': None, **fields,
+              '_order': next(_span_order)}
+    listener = _stage_listener.get()
+    if listener is not None:
+        listener('start', record)
+
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        current, peak = tracemalloc.get_traced_memory()
+        # 重置峰值前，把外层阶段到目前为止的峰值保存下来
+        if parents:
+            parents[-1]['_max_traced'] = max(parents[-1].get('_max_traced', 0), peak)
+        tracemalloc.reset_peak()
+        record['_start_traced'] = current
+
+    token = _open_spans.set(parents + (record,))
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['seconds'] = time.perf_counter() - start
+        _open_spans.reset(token)
+
+        if tracing and tracemalloc.is_tracing():
+            peak = max(tracemalloc.get_traced_memory()[1], record.pop('_max_traced', 0))
+            record['peak_mb'] = (peak - record.pop('_start_traced')) / 2 ** 20
+            if parents:
+                parents[-1]['_max_traced'] = max(parents[-1].get('_max_traced', 0), peak)
+        else:
+            record.pop('_start_traced', None)
+            record.pop('_max_traced', None)
+
+        _log_span(record)
+        spans = _collected_spans.get()
+        if spans is not None:
+            spans.append(record)
+        if listener is not None:
+            listener('end', record)
+
+
+def _log_span(record):
+    parts = [f"耗时 {record['seconds']:.3f}s"]
+    if record['rows'] is not None:
+        parts.append(f"{record['rows']} 行")
+    if record['peak_mb'] is not None:
+        parts.append(f"内存峰值 {record['peak_mb']:.1f} MB")
+    extra = {key: value for key, value in record.items()
+             if key not in ('name', 'depth', 'rows', 'seconds', 'peak_mb') and not key.startswith('_')}
+    if extra:
+        parts.append(', '.join(f"{key}={value}" for key, value in extra.items()))
+    logger.info("%s[%s] %s", '  ' * record['depth'], record['name'], '，'.join(parts))
+
+
+# 阶段记录整理为表格行（按开始顺序，嵌套阶段缩进），供 UI 展示
+def spans_table(spans):
+    rows = []
+    for record in sorted(spans, key=lambda item: item['_order']):
+        rows.append({
+            '阶段': '　' * record['depth'] + record['name'],
+            '耗时(s)': round(record['seconds'], 3),
+            '行数': record['rows'],
+            '内存峰值(MB)': None if record['peak_mb'] is None else round(record['peak_mb'], 1),
+        })
+    return rows
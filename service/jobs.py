@@ -0,0 +1,265 @@
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from service.instrument import collect_spans, logger, watch_stages
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# 任务状态
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATUSES = (DONE, FAILED, CANCELLED)
+
+STATUS_LABELS = {PENDING: '排队中', RUNNING: '运行中', DONE: '已完成', FAILED: '失败', CANCELLED: '已取消'}
+
+# 进程内共用的任务执行器：最多同时运行 HR_TOOL_MAX_JOBS 个任务（默认 2），其余按提交顺序排队
+DEFAULT_MAX_JOBS = 2
+# 任务列表中保留的已结束任务数（供管理视图查看；结果被会话取走后只保留状态、耗时等信息）
+FINISHED_HISTORY = 20
+
+_lock = threading.Lock()
+_executor = None
+# 全部任务（按提交顺序），以及未结束任务的去重键 → 任务
+_jobs = {}
+_active = {}
+
+
+# 任务被取消：在下一个阶段（span）开始处抛出，中止后续计算
+class JobCancelled(Exception):
+    pass
+
+
+def max_jobs():
+    return max(1, int(os.environ.get('HR_TOOL_MAX_JOBS', DEFAULT_MAX_JOBS)))
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=max_jobs(), thread_name_prefix='hr_tool_job')
+    return _executor
+
+
+# 提交后台任务：由共用执行器执行 fn(*args, **kwargs)，立即返回任务句柄（dict，可保存在 session_state 中）
+#   status            pending / running / done / failed / cancelled
+#   stage             当前正在执行的阶段名称（service 层 span）
+#   stages_done       已完成的顶层阶段数，expected_stages 为预计顶层阶段数（用于进度条，可为 None）
+#   spans             已完成阶段的记录（同 collect_spans），任务运行中持续增长
+#   result / error / traceback    结果，或失败时的错误信息与调用栈；结果经 collect_job 交给各会话后即释放
+#   cpu_seconds / peak_mb         近似的资源占用：任务线程自身的 CPU 时间（不含读取文件时子进程的解析），
+#                                 以及各阶段内存峰值的最大值（tracemalloc 开启时；按进程统计，并发任务会互相计入）
+# key 为输入的去重键：相同 key 的任务尚未结束时直接返回该任务（多个会话共用一次计算），subscribers 为共用的会话数
+# 取消为协作式：cancel_job 只设置标记，计算在下一个阶段开始时停止
+def submit_job(fn, *args, label='', expected_stages=None, key=None, **kwargs):
+    with _lock:
+        job = _active.get(key) if key is not None else None
+        if job is not None:
+            job['subscribers'] += 1
+            logger.info(f"任务 {job['label'] or job['id']} 输入相同，共用正在进行的计算（{job['subscribers']} 个会话）")
+            return job
+
+        job = {
+            'id': uuid.uuid4().hex,
+            'label': label,
+            'key': key,
+            'status': PENDING,
+            'stage': None,
+            'stages_done': 0,
+            'expected_stages': expected_stages,
+            'spans': [],
+            'result': None,
+            'error': None,
+            'traceback': None,
+            'cancel_requested': False,
+            'subscribers': 1,
+            'collected': 0,
+            'cpu_seconds': 0.0,
+            'peak_mb': None,
+            'submitted_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+        }
+        _jobs[job['id']] = job
+        if key is not None:
+            _active[key] = job
+        _prune_finished()
+        _get_executor().submit(_run_job, job, fn, args, kwargs)
+    return job
+
+
+# 只保留最近 FINISHED_HISTORY 个已结束任务（调用方持有 _lock）
+def _prune_finished():
+    finished = [job_id for job_id, job in _jobs.items() if job['status'] in FINISHED_STATUSES]
+    for job_id in finished[:max(0, len(finished) - FINISHED_HISTORY)]:
+        del _jobs[job_id]
+
+
+# 阶段监听：记录当前阶段、已完成的顶层阶段数与资源占用，阶段开始前检查取消标记
+def _job_listener(job, cpu_start):
+    stack = []
+
+    def listener(event, record):
+        if event == 'start':
+            if job['cancel_requested']:
+                raise JobCancelled(f"任务 {job['label'] or job['id']} 已取消")
+            stack.append(record['name'])
+        else:
+            if stack:
+                stack.pop()
+            if record['depth'] == 0:
+                job['stages_done'] += 1
+            if record['peak_mb'] is not None:
+                job['peak_mb'] = max(job['peak_mb'] or 0.0, record['peak_mb'])
+        job['stage'] = stack[-1] if stack else None
+        job['cpu_seconds'] = time.thread_time() - cpu_start
+
+    return listener
+
+
+# 在执行器线程中运行任务；状态最后更新，读取方看到结束状态时结果已就绪
+def _run_job(job, fn, args, kwargs):
+    job['started_at'] = time.time()
+    cpu_start = time.thread_time()
+    job['status'] = RUNNING
+    try:
+        with collect_spans() as spans, watch_stages(_job_listener(job, cpu_start)):
+            job['spans'] = spans
+            if job['cancel_requested']:
+                raise JobCancelled(f"任务 {job['label'] or job['id']} 已取消")
+            job['result'] = fn(*args, **kwargs)
+        status = DONE
+    except JobCancelled:
+        logger.info(f"任务 {job['label'] or job['id']} 已取消")
+        status = CANCELLED
+    except Exception as e:
+        logger.exception(f"任务 {job['label'] or job['id']} 失败")
+        job['error'] = str(e)
+        job['traceback'] = traceback.format_exc()
+        status = FAILED
+    job['cpu_seconds'] = time.thread_time() - cpu_start
+    job['finished_at'] = time.time()
+    job['stage'] = None
+    with _lock:
+        if _active.get(job['key']) is job:
+            del _active[job['key']]
+        job['status'] = status
+        _release_result(job)
+
+
+# 会话放弃任务：共用该任务的会话都放弃后才真正取消（当前阶段结束后生效；排队中的任务不再执行）
+# 返回任务是否被取消；未取消时其他会话仍在等待结果
+def cancel_job(job):
+    with _lock:
+        job['subscribers'] = max(0, job['subscribers'] - 1)
+        if job['subscribers'] == 0 and job['status'] not in FINISHED_STATUSES:
+            job['cancel_requested'] = True
+            # 之后提交的相同输入重新计算，不再共用这个即将取消的任务
+            if _active.get(job['key']) is job:
+                del _active[job['key']]
+        _release_result(job)
+    return job['cancel_requested']
+
+
+# 会话取走已结束任务的结果（每个会话调用一次）：共用该任务的会话都取走或放弃后，
+# 任务不再持有结果，结果只保存在各会话自己的 session_state 中，不会因任务历史而常驻内存
+def collect_job(job):
+    with _lock:
+        result = job['result']
+        job['collected'] += 1
+        _release_result(job)
+    return result
+
+
+# 已结束且所有会话都已取走结果（或已放弃）时释放结果（调用方持有 _lock）
+def _release_result(job):
+    if job['status'] in FINISHED_STATUSES and job['collected'] >= job['subscribers']:
+        job['result'] = None
+
+
+def job_finished(job):
+    return job['status'] in FINISHED_STATUSES
+
+
+# 任务进度（0~1）：按已完成的顶层阶段数估算，结束前最多 0.99；未提供预计阶段数时为 None
+def job_progress(job):
+    if job['status'] == DONE:
+        return 1.0
+    if not job['expected_stages']:
+        return None
+    return min(job['stages_done'] / job['expected_stages'], 0.99)
+
+
+# 任务已运行时长（秒），结束后为总耗时
+def job_elapsed(job):
+    if job['started_at'] is None:
+        return 0.0
+    return (job['finished_at'] or time.time()) - job['started_at']
+
+
+# 排队中的任务前面还有几个排队任务（不在排队时为 0）
+def queue_position(job):
+    if job['status'] != PENDING:
+        return 0
+    with _lock:
+        pending = [other for other in _jobs.values() if other['status'] == PENDING]
+    return sum(other['submitted_at'] < job['submitted_at'] for other in pending)
+
+
+# 进程当前内存占用（MB）：Linux 读 /proc，其他平台退回为进程峰值，无法获取时为 None
+def process_memory_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is None:
+        return None
+    # ru_maxrss 在 macOS 上为字节，Linux 上为 KB
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if os.uname().sysname == 'Darwin' else peak / 1024
+
+
+# 执行器概况：并发上限、排队 / 运行中任务数与进程内存
+def executor_status():
+    with _lock:
+        statuses = [job['status'] for job in _jobs.values()]
+    return {
+        'max_jobs': max_jobs(),
+        'pending': statuses.count(PENDING),
+        'running': statuses.count(RUNNING),
+        'memory_mb': process_memory_mb(),
+    }
+
+
+# 管理视图的任务表格行：未结束的任务在前（按提交顺序），随后是最近结束的任务
+def jobs_table():
+    with _lock:
+        jobs = list(_jobs.values())
+    jobs.sort(key=lambda job: (job['status'] in FINISHED_STATUSES, job['submitted_at']))
+    now = time.time()
+    rows = []
+    for job in jobs:
+        progress = job_progress(job)
+        rows.append({
+            '任务': job['label'] or job['id'][:8],
+            '状态': STATUS_LABELS[job['status']],
+            '当前阶段': job['stage'],
+            '进度': None if progress is None else round(progress * 100),
+            '等待(s)': round((job['started_at'] or now) - job['submitted_at'], 1),
+            '运行(s)': round(job_elapsed(job), 1),
+            '线程CPU(s，约)': round(job['cpu_seconds'], 1),
+            '进程内存峰值(MB，约)': None if job['peak_mb'] is None else round(job['peak_mb'], 1),
+            '会话数': job['subscribers'],
+        })
+    return rows
@@ -1,5 +1,16 @@
+import numpy as np
 import pandas as pd
 
+from service.columns import (
+    ORG_COLUMNS, BEFORE_ORG_COLUMNS, AFTER_ORG_COLUMNS,
+    TRANSFER_COLUMNS, ONBOARD_COLUMNS, RESIGNED_COLUMNS, MERGED_COLUMNS, ORG_LEVEL_NAMES
+)
+from service.compact import compact_frame, compact_frames, memory_report
+from service.dates import parse_dates
+from service.instrument import logger, span
+from service.reader import read_table_columns, read_tables, save_table_snapshot
+from service.writer import write_excel
+
 
 def rank_clo(df_final):
     # 选择并重排所需的列
@@ -16,16 +27,9 @@ def rank_clo(df_final):
         elif col in ['入职日期', '调离日期', '调入日期', '离职日期']:
             df_final[col] = pd.NaT
 
-    df_output = df_final[required_columns].copy()
-
-    # 将 NaT (Not a Time) 转换为 None 或空白字符串以便在Excel中显示为空白
-    date_columns = ['入职日期', '调离日期', '调入日期', '离职日期']
-    for col in date_columns:
-        df_output[col] = df_output[col].dt.strftime('%Y-%m-%d')  # 先格式化为字符串
-        df_output[col] = df_output[col].replace('NaT', '')  # 再替换 NaT 字符串
-
-    df_output = df_output[required_columns]
-    return df_output
+    # 日期保持 datetime64（导出时按 yyyy-mm-dd 格式写为日期单元格，空值写为空白），
+    # 文本列保持分类编码，结果常驻 session_state 时不再持有大量字符串对象
+    return compact_frame(df_final[required_columns])
 
 
 # 输出文件
@@ -44,23 +48,23 @@ def output_result_file(df_final, output_file):
         elif col in ['入职日期', '调离日期', '调入日期', '离职日期']:
             df_final[col] = pd.NaT
 
-    df_output = df_final[required_columns].copy()
-
-    # 将 NaT (Not a Time) 转换为 None 或空白字符串以便在Excel中显示为空白
-    date_columns = ['入职日期', '调离日期', '调入日期', '离职日期']
-    for col in date_columns:
-        df_output[col] = df_output[col].dt.strftime('%Y-%m-%d')  # 先格式化为字符串
-        df_output[col] = df_output[col].replace('NaT', '')  # 再替换 NaT 字符串
-
-    df_output = df_output[required_columns]
+    df_output = df_final[required_columns]
 
-    print(f"数据处理完毕，准备写入文件: {output_file}")
     # --- 6. 保存结果 ---
     try:
-        df_output.to_excel(output_file, index=False, engine='openpyxl')
-        print(f"成功生成汇总表: {output_file}")
+        write_excel({'Sheet1': df_output}, output_file)
+        logger.info(f"成功生成汇总表: {output_file}")
     except Exception as e:
-        print(f"写入文件时出错: {e}")
+        logger.error(f"写入文件时出错: {e}")
+        return
+    save_result_snapshot(output_file, df_output)
+
+
+# 合并结果导出后写入快照缓存（键为导出文件的内容哈希）：该文件之后作为上次结果上传做增量合并时，
+# read_previous_result 直接加载快照，不再重新解析 xlsx
+def save_result_snapshot(output_file, df_output):
+    with span('写入结果快照', rows=len(df_output)):
+        save_table_snapshot(output_file, MERGED_COLUMNS, df_output)
 
 
 # 修改列名
@@ -74,54 +78,221 @@ def rename_df(df, col_name, target_col_name):
     return df
 
 
-# 判断是否跨组织调转
-def is_cross_dep(dep_level, latest):
-    msg = ''
-    # 若本部门调转，则无需设置调转时间信息
-    if (dep_level == 1) and latest['调动前一级组织'] == latest['调动后一级组织']:
-        msg = "一级组织内调转"
-    elif (dep_level == 2) and latest['调动前一级组织'] == latest['调动后一级组织'] and latest['调动前二级组织'] == latest['调动后二级组织']:
-        msg = "二级组织内调转"
-    elif (dep_level == 3) and latest['调动前一级组织'] == latest['调动后一级组织'] and latest['调动前二级组织'] == latest['调动后二级组织'] and \
-            latest['调动前三级组织'] == latest['调动后三级组织']:
-        msg = "三级组织内调转"
-    elif (dep_level == 4) and latest['调动前一级组织'] == latest['调动后一级组织'] and latest['调动前二级组织'] == latest['调动后二级组织'] and \
-            latest['调动前三级组织'] == latest['调动后三级组织'] and latest['调动前部门'] == latest['调动后部门']:
-        msg = "四级组织内调转"
+# 调动前/后组织开始不同的层级深度（逐层向量化比较）：
+# 0 表示一级组织即不同，4 表示四级组织（部门）都相同；调动在 N 级组织内 ⇔ 深度 >= N
+def org_divergence_depth(df_transfer):
+    same = np.ones(len(df_transfer), dtype=bool)
+    depth = np.zeros(len(df_transfer), dtype=np.int8)
+    for before_col, after_col in zip(BEFORE_ORG_COLUMNS, AFTER_ORG_COLUMNS):
+        same &= (df_transfer[before_col] == df_transfer[after_col]).to_numpy()
+        depth += same
+    return depth
+
+
+# 按分歧深度判断每条调动是否跨 dep_level 级组织
+def is_cross_level(dep_level, depth):
+    if dep_level not in ORG_LEVEL_NAMES:
+        return np.ones(len(depth), dtype=bool)
+    return np.asarray(depth) < dep_level
 
-    return msg
 
+# 读取员工信息文件：三份花名册并行解析（见 read_tables），parallel=False 时在当前进程顺序读取
+# （批量命令行已按组织多进程并行，无需再嵌套进程池）
+# compact=True 时三份花名册的组织、工号、姓名共用同一套字典（需与其他结果一起编码时传 False，见 compact_frames）
+def read_file(transfer_file, zai_file, li_file, parallel=True, compact=True):
+    requests = [(file, columns) for file, columns in (
+        (transfer_file, TRANSFER_COLUMNS), (zai_file, ONBOARD_COLUMNS), (li_file, RESIGNED_COLUMNS)
+    ) if file]
+    with span('读取文件', files=len(requests)) as record:
+        frames = read_tables(requests, max_workers=None if parallel else 1)
+        record['rows'] = sum(len(df) for df in frames)
+    frames = iter(frames)
 
-# 读取员工信息文件
-def read_file(transfer_file, zai_file, li_file):
-    df_tiaodong = pd.read_excel(transfer_file)
+    df_tiaodong = next(frames) if transfer_file else pd.DataFrame()
 
-    df_zai = pd.read_excel(zai_file) if zai_file else pd.DataFrame()
+    df_zai = next(frames) if zai_file else pd.DataFrame()
 
-    df_li = pd.read_excel(li_file) if li_file else pd.DataFrame()
+    df_li = next(frames) if li_file else pd.DataFrame()
     df_li = rename_df(df_li, "最后工作日", "离职日期")
     df_li = rename_df(df_li, "部门", "四级组织")
 
+    if compact:
+        df_tiaodong, df_zai, df_li = compact_frames(df_tiaodong, df_zai, df_li)
+        for row in memory_report({'调动': df_tiaodong, '在职': df_zai, '离职': df_li}):
+            logger.info(f"{row['数据表']}花名册 {row['行数']} 行，内存 {row['内存(MB)']} MB")
     return df_tiaodong, df_zai, df_li
 
 
-# 合并处理正常员工数据
-def process_employee_data(dep_level, all_employees_set, df_tiaodong, df_zai, df_li, output_file):
-    # --- 2. 初始化最终表 ---
-    print("正在初始化员工列表...")
-    # 将集合转换为 DataFrame，方便后续操作
-    df_final = pd.DataFrame(list(all_employees_set), columns=['工号'])
+# 读取上次合并结果（增量合并使用）
+def read_previous_result(previous_file):
+    df_previous = read_table_columns(previous_file, MERGED_COLUMNS)
+    if '跨组织调转' not in df_previous.columns:
+        df_previous['跨组织调转'] = ''
+        return df_previous
 
-    # 合并在职员工信息（入职时间）
-    df_join_time = (
+    # 空白单元格读入为缺失值，统一为空串（分类列需先把空串加入字典）
+    labels = df_previous['跨组织调转']
+    if isinstance(labels.dtype, pd.CategoricalDtype) and '' not in labels.cat.categories:
+        labels = labels.cat.add_categories([''])
+    df_previous['跨组织调转'] = labels.fillna('')
+    return df_previous
+
+
+# 全量员工工号集合（在职 + 离职）
+def collect_employee_ids(df_zai, df_li):
+    all_employees_set = set()
+    if not df_zai.empty:
+        all_employees_set.update(df_zai['工号'].dropna().astype(str).tolist())
+    if not df_li.empty:
+        all_employees_set.update(df_li['工号'].dropna().astype(str).tolist())
+    return all_employees_set
+
+
+# 员工基础信息（入职时间、姓名、组织），在职名单优先
+def _employee_join_info(df_zai, df_li):
+    info_columns = ['工号', '入职日期', '姓名'] + ORG_COLUMNS
+    return (
         pd.concat([
-            df_zai[['工号', '入职日期', '姓名', '一级组织', '二级组织', '三级组织', '四级组织']].drop_duplicates(
-                '工号') if not df_zai.empty else pd.DataFrame(),
-            df_li[['工号', '入职日期', '姓名', '一级组织', '二级组织', '三级组织', '四级组织']].drop_duplicates(
-                '工号') if not df_li.empty else pd.DataFrame()
+            df_zai[info_columns].drop_duplicates('工号') if not df_zai.empty else pd.DataFrame(),
+            df_li[info_columns].drop_duplicates('工号') if not df_li.empty else pd.DataFrame()
         ], ignore_index=True).drop_duplicates('工号', keep='first')
     )
 
+
+# 调动记录按工号、调动日期稳定排序，并计算每条记录的组织分歧深度
+def sort_transfers(df_tiaodong):
+    if df_tiaodong.empty or '工号' not in df_tiaodong.columns:
+        df_tiaodong = pd.DataFrame(columns=['工号', '姓名', '入职日期', '调动日期'] + BEFORE_ORG_COLUMNS + AFTER_ORG_COLUMNS)
+        df_tiaodong = df_tiaodong.astype({'入职日期': 'datetime64[ns]', '调动日期': 'datetime64[ns]'})
+
+    df_tiaodong_sorted = df_tiaodong.dropna(subset=['工号']).sort_values(['工号', '调动日期'], kind='stable')
+    df_tiaodong_sorted = df_tiaodong_sorted.reset_index(drop=True)
+    df_tiaodong_sorted['组织分歧层级'] = org_divergence_depth(df_tiaodong_sorted)
+    return df_tiaodong_sorted
+
+
+# 从已排序的调动记录中取每个工号最后一条，按工号索引（保留工号列）
+def _latest_transfers(df_tiaodong_sorted):
+    latest = df_tiaodong_sorted.drop_duplicates('工号', keep='last')
+    return latest.set_index('工号', drop=False).rename_axis(None)
+
+
+# 构建“每个工号最新一条调动记录”索引（按工号、调动日期排序后取每组最后一条）
+# 组织分歧深度随排序一起算好，各层级判断只需一次数组比较
+def build_latest_transfer_index(df_tiaodong):
+    return _latest_transfers(sort_transfers(df_tiaodong))
+
+
+# 全量调动时间线：把每名员工所有跨 dep_level 级组织的调动展开为组织区段
+# （入职 → 第一次调离、每次调入 → 下一次调离、最后一次调入 → 离职），
+# 全部基于排序后的数组和 shift 批量完成，不按员工循环。
+# 返回区段表（工号 + 组织列 + 调入/调离日期 + 跨组织调转），只包含至少有一次跨组织调动的员工
+def build_transfer_timeline(dep_level, df_tiaodong_sorted):
+    is_cross = is_cross_level(dep_level, df_tiaodong_sorted['组织分歧层级'].to_numpy())
+    cross_df = df_tiaodong_sorted[is_cross]
+    cross_msg = f"跨{dep_level}组织调转"
+    # 工号、组织列用 .array 取值，分类编码原样传递，不展开为字符串
+    emp_ids = cross_df['工号'].array
+    emp_codes = pd.factorize(cross_df['工号'])[0]
+    transfer_dates = cross_df['调动日期'].to_numpy()
+
+    # 同一员工的下一次跨组织调动日期即本区段的调离日期，最后一个区段调离日期为空
+    same_emp_next = np.zeros(len(cross_df), dtype=bool)
+    same_emp_next[:-1] = emp_codes[1:] == emp_codes[:-1]
+    next_dates = pd.Series(transfer_dates).shift(-1).where(same_emp_next)
+
+    # 每名员工第一次跨组织调动前的区段（调动前组织，入职 → 第一次调离）
+    is_first = np.ones(len(cross_df), dtype=bool)
+    is_first[1:] = emp_codes[1:] != emp_codes[:-1]
+    first_df = pd.DataFrame({'工号': emp_ids[is_first]})
+    for col, before_col in zip(ORG_COLUMNS, BEFORE_ORG_COLUMNS):
+        first_df[col] = cross_df[before_col].array[is_first]
+    first_df['调入日期'] = pd.NaT
+    first_df['调离日期'] = transfer_dates[is_first]
+    first_df.index = np.flatnonzero(is_first) * 2
+
+    # 每次跨组织调动后的区段（调动后组织，调入 → 下一次调离）
+    after_df = pd.DataFrame({'工号': emp_ids})
+    for col, after_col in zip(ORG_COLUMNS, AFTER_ORG_COLUMNS):
+        after_df[col] = cross_df[after_col].array
+    after_df['调入日期'] = transfer_dates
+    after_df['调离日期'] = next_dates.to_numpy()
+    after_df.index = np.arange(len(cross_df)) * 2 + 1
+
+    # 偶数位为首个区段，奇数位为调动后区段，按位置排序即得每名员工的时间顺序
+    timeline = pd.concat([first_df, after_df]).sort_index().reset_index(drop=True)
+    timeline['跨组织调转'] = cross_msg
+    return timeline
+
+
+# 用时间线区段替换员工的单行记录：返回 (被展开员工的掩码, 区段记录)，
+# 区段记录沿用员工在 base_df 中的索引，以便与其余记录按原员工顺序合并。
+# base_df 中同一工号可能有多行（如离职花名册重复列出同一工号），每一行都按时间线展开
+def _expand_timeline(base_df, timeline):
+    """
+    >>> base_df = pd.DataFrame({'工号': ['A', 'B', 'B'], '离职日期': pd.to_datetime([None, '2025-05-01', '2025-06-01'])})
+    >>> timeline = pd.DataFrame({'工号': ['B', 'B'], '一级组织': ['X', 'Y'], '二级组织': None, '三级组织': None,
+    ...                          '四级组织': None, '调入日期': pd.to_datetime([None, '2025-03-01']),
+    ...                          '调离日期': pd.to_datetime(['2025-03-01', None]), '跨组织调转': '跨一级组织调转'})
+    >>> covered, segment_df = _expand_timeline(base_df, timeline)
+    >>> covered.tolist()
+    [False, True, True]
+    >>> segment_df.sort_index(kind='stable')[['工号', '一级组织']].to_records().tolist()
+    [(1, 'B', 'X'), (1, 'B', 'Y'), (2, 'B', 'X'), (2, 'B', 'Y')]
+    """
+    # 区段 × 员工行 按工号配对（区段顺序不变）
+    pairs = pd.DataFrame({'工号': timeline['工号'].array, 'segment': np.arange(len(timeline))}).merge(
+        pd.DataFrame({'工号': base_df['工号'].array, 'position': np.arange(len(base_df))}), on='工号'
+    )
+    positions = pairs['position'].to_numpy()
+    segments = pairs['segment'].to_numpy()
+
+    segment_df = base_df.iloc[positions].copy()
+    for col in ORG_COLUMNS + ['调入日期', '调离日期', '跨组织调转']:
+        segment_df[col] = timeline[col].array[segments]
+
+    covered = np.zeros(len(base_df), dtype=bool)
+    covered[positions] = True
+    return covered, segment_df
+
+
+# 根据最新调动记录批量构造调动前/调动后记录，base_df 与 latest_df 按行对齐
+def _expand_latest_transfers(dep_level, base_df, latest_df):
+    is_cross = is_cross_level(dep_level, latest_df['组织分歧层级'].to_numpy())
+    cross_msg = f"跨{dep_level}组织调转"
+    msg = f"{ORG_LEVEL_NAMES[dep_level]}内调转" if dep_level in ORG_LEVEL_NAMES else cross_msg
+    transfer_date = pd.Series(latest_df['调动日期'].to_numpy(), index=base_df.index)
+
+    # 构造调动前的记录（只更新组织和调离时间；组织内调转不设置调转时间）
+    before_df = base_df.copy()
+    for col, before_col in zip(ORG_COLUMNS, BEFORE_ORG_COLUMNS):
+        before_df[col] = latest_df[before_col].array
+    before_df['调入日期'] = pd.NaT
+    before_df['调离日期'] = transfer_date.where(is_cross, before_df['调离日期'])
+    before_df['跨组织调转'] = np.where(is_cross, cross_msg, msg)
+
+    # 构造调动后的记录（仅跨组织调转）
+    after_df = base_df[is_cross].copy()
+    for col, after_col in zip(ORG_COLUMNS, AFTER_ORG_COLUMNS):
+        after_df[col] = latest_df[after_col].array[is_cross]
+    after_df['调入日期'] = transfer_date[is_cross]
+    after_df['调离日期'] = pd.NaT
+    after_df['跨组织调转'] = cross_msg
+
+    return before_df, after_df
+
+
+# 初始化员工表：全量工号 + 入职信息 + 离职日期
+def _build_employee_base(all_employees_set, df_zai, df_li):
+    # 将集合转换为 DataFrame，方便后续操作；工号沿用花名册的分类类型，合并时直接比较整数编码
+    df_final = pd.DataFrame(list(all_employees_set), columns=['工号'])
+    id_dtypes = {df['工号'].dtype for df in (df_zai, df_li) if '工号' in df.columns}
+    if len(id_dtypes) == 1 and isinstance(next(iter(id_dtypes)), pd.CategoricalDtype):
+        df_final['工号'] = df_final['工号'].astype(id_dtypes.pop())
+
+    # 合并在职员工信息（入职时间）
+    df_join_time = _employee_join_info(df_zai, df_li)
+
     if not df_join_time.empty:
         df_final = df_final.merge(df_join_time, on='工号', how='left')
     else:
@@ -137,65 +308,53 @@ def process_employee_data(dep_level, all_employees_set, df_tiaodong, df_zai, df_
     df_final['调离日期'] = pd.NaT
     df_final['调入日期'] = pd.NaT
     df_final['跨组织调转'] = ""
+    return df_final
+
+
+# 按组织层级把最新调动记录拼接到员工表（positions 为员工在 latest_index 中的位置，-1 表示无调动）
+# 提供 timeline 时，有跨组织调动的员工按时间线展开为多个区段，其余员工仍按最新一条处理
+def _merge_latest_transfers(dep_level, df_final, latest_index, positions, timeline=None):
+    has_transfer = positions >= 0
+    frames = []
+    if timeline is not None:
+        covered, segment_df = _expand_timeline(df_final, timeline)
+        has_transfer = has_transfer & ~covered
+        frames.append(segment_df)
+    else:
+        covered = np.zeros(len(df_final), dtype=bool)
+
+    # 没有调动：保留原行；有调动：按最新一条批量生成调动前/调动后记录
+    before_df, after_df = _expand_latest_transfers(
+        dep_level, df_final[has_transfer], latest_index.iloc[positions[has_transfer]]
+    )
+
+    # 合并成新的 DataFrame（按原员工顺序，调动前记录在前）
+    return (
+        pd.concat([df_final[~has_transfer & ~covered], before_df, after_df] + frames)
+        .sort_index(kind='stable')
+        .reset_index(drop=True)
+    )
 
-    print(f"初始员工列表处理完成，共 {len(df_final)} 名员工。")
+
+# 合并处理正常员工数据
+# timeline=True 时展开每名员工的全部跨组织调动（完整时间线），否则只取最新一条调动
+def process_employee_data(dep_level, all_employees_set, df_tiaodong, df_zai, df_li, output_file, timeline=False):
+    # --- 2. 初始化最终表 ---
+    with span('初始化员工列表') as record:
+        df_final = _build_employee_base(all_employees_set, df_zai, df_li)
+        record['rows'] = len(df_final)
 
     # --- 3. 处理调动记录 ---
-    print("正在处理调动记录...")
-
-    # 首先，按工号和调动日期排序
-    df_tiaodong_sorted = df_tiaodong.sort_values(['工号', '调动日期']).reset_index(drop=True)
-
-    transfer_final = []
-    for idx, row in df_final.iterrows():
-        emp_id = row['工号']
-        # 获取该员工的所有调动记录
-        emp_transfers = df_tiaodong_sorted[df_tiaodong_sorted['工号'] == emp_id]
-
-        if emp_transfers.empty:
-            # 没有调动：保留原行
-            transfer_final.append(row.copy())
-        else:
-            before_row = row.copy()
-
-            # 有调动：取最新的一条（你已经按日期排序）
-            latest = emp_transfers.iloc[-1]
-            transfer_date = latest['调动日期']
-
-            # 构造调动前的记录（复制原 row，只更新组织和调离时间）
-            before_row['一级组织'] = latest['调动前一级组织']
-            before_row['二级组织'] = latest['调动前二级组织']
-            before_row['三级组织'] = latest['调动前三级组织']
-            before_row['四级组织'] = latest['调动前部门']
-            before_row['调入日期'] = pd.NaT
-
-            msg = is_cross_dep(dep_level, latest)
-            if msg != '':
-                before_row['跨组织调转'] = msg
-                transfer_final.append(before_row)
-                continue
-
-            before_row['跨组织调转'] = f"跨{dep_level}组织调转"
-            before_row['调离日期'] = transfer_date
-            # 构造调动后的记录
-            after_row = row.copy()
-            after_row['一级组织'] = latest['调动后一级组织']
-            after_row['二级组织'] = latest['调动后二级组织']
-            after_row['三级组织'] = latest['调动后三级组织']
-            after_row['四级组织'] = latest['调动后部门']
-            after_row['调入日期'] = transfer_date
-            after_row['调离日期'] = pd.NaT
-            after_row['跨组织调转'] = f"跨{dep_level}组织调转"
-
-            # 添加两条记录
-            transfer_final.extend([before_row, after_row])
-
-    # 合并成新的 DataFrame
-    transfer_final_df = pd.DataFrame(transfer_final).reset_index(drop=True)
-
-    print("调动记录处理完成。")
-
-    print("正在准备输出数据...")
+    # 预先构建“工号 → 最新调动记录”索引，一次定位所有员工
+    with span('构建调动索引', rows=len(df_tiaodong)):
+        df_tiaodong_sorted = sort_transfers(df_tiaodong)
+        latest_index = _latest_transfers(df_tiaodong_sorted)
+        positions = latest_index.index.get_indexer(df_final['工号'])
+        transfer_timeline = build_transfer_timeline(dep_level, df_tiaodong_sorted) if timeline else None
+
+    with span('展开调动记录', level=ORG_LEVEL_NAMES[dep_level]) as record:
+        transfer_final_df = _merge_latest_transfers(dep_level, df_final, latest_index, positions, transfer_timeline)
+        record['rows'] = len(transfer_final_df)
 
     # 输出文件
     if output_file:
@@ -204,85 +363,58 @@ def process_employee_data(dep_level, all_employees_set, df_tiaodong, df_zai, df_
     return transfer_final_df
 
 
-# 合并处理正常员工数据
-def process_abnormal_employee_data(dep_level, all_employees_set, df_tiaodong, output_file):
-    # --- 2. 初始化最终表 ---
-    print("正在异常初始化员工列表...")
-    # 将集合转换为 DataFrame，方便后续操作
-    df_final = pd.DataFrame(list(all_employees_set), columns=['工号'])
-
-    # 创建一个异常员工的集合 （调动人员 = 不在全量员工名单中）
-    diaodong_employees_set = set()
-    if not df_tiaodong.empty:
-        diaodong_employees_set.update(df_tiaodong['工号'].dropna().astype(str).tolist())
+# 初始化异常员工表：反连接，异常员工 = 调动人员中不在全量员工名单（在职 + 离职）里的工号
+def _build_abnormal_base(all_employees_set, latest_index):
+    abnormal_mask = ~latest_index['工号'].astype(str).isin(all_employees_set)
+    latest_df = latest_index[abnormal_mask]
+
+    abnormal_df_final = pd.DataFrame({
+        '工号': latest_df['工号'].array,
+        '姓名': latest_df['姓名'].array,
+        '一级组织': None,
+        '二级组织': None,
+        '三级组织': None,
+        '四级组织': None,
+        '入职日期': latest_df['入职日期'].array,
+        '离职日期': pd.NaT,
+        '调入日期': pd.NaT,
+        '调离日期': pd.NaT,
+        '跨组织调转': ''
+    })
+    return abnormal_df_final, latest_df
+
+
+# 按组织层级批量构造异常员工的调动前/调动后记录（提供 timeline 时按时间线展开）
+def _merge_abnormal_transfers(dep_level, abnormal_df_final, latest_df, timeline=None):
+    frames = []
+    if timeline is not None:
+        covered, segment_df = _expand_timeline(abnormal_df_final, timeline)
+        abnormal_df_final, latest_df = abnormal_df_final[~covered], latest_df[~covered]
+        frames.append(segment_df)
+
+    before_df, after_df = _expand_latest_transfers(dep_level, abnormal_df_final, latest_df)
+    return (
+        pd.concat([before_df, after_df] + frames)
+        .sort_index(kind='stable')
+        .reset_index(drop=True)
+    )
 
-    abnormal_employees_set = diaodong_employees_set - all_employees_set
-    abnormal_df_final = pd.DataFrame(list(abnormal_employees_set), columns=['工号'])
 
-    print(f"初始异常员工列表处理完成，共 {len(abnormal_df_final)} 名员工。")
+# 合并处理异常员工数据
+def process_abnormal_employee_data(dep_level, all_employees_set, df_tiaodong, output_file, timeline=False):
+    # --- 2. 初始化最终表 ---
+    # 每个调动工号的最新一条调动记录
+    with span('构建异常员工索引', rows=len(df_tiaodong)) as record:
+        df_tiaodong_sorted = sort_transfers(df_tiaodong)
+        latest_index = _latest_transfers(df_tiaodong_sorted)
+        abnormal_df_final, latest_df = _build_abnormal_base(all_employees_set, latest_index)
+        record['abnormal'] = len(abnormal_df_final)
 
     # --- 3. 处理调动记录 ---
-    print("正在处理异常调动记录...")
-    print("异常调动记录处理开始。")
-
-    df_tiaodong_sorted = df_tiaodong.sort_values(['工号', '调动日期']).reset_index(drop=True)
-
-    abnormal_transfer_res = []
-
-    for idx, row in abnormal_df_final.iterrows():
-        emp_id = row['工号']
-        # 获取该员工的所有调动记录
-        emp_transfers = df_tiaodong_sorted[df_tiaodong_sorted['工号'] == emp_id]
-
-        latest = emp_transfers.iloc[-1]
-
-        transfer_date = latest['调动日期']
-
-        before_row = {
-            '工号': latest['工号'],
-            '姓名': latest['姓名'],
-            '一级组织': latest['调动前一级组织'],
-            '二级组织': latest['调动前二级组织'],
-            '三级组织': latest['调动前三级组织'],
-            '四级组织': latest['调动前部门'],
-            '入职日期': latest['入职日期'],
-            '离职日期': pd.NaT,
-            '调入日期': pd.NaT,
-            '调离日期': pd.NaT
-        }
-
-        msg = is_cross_dep(dep_level, latest)
-        if msg != '':
-            before_row['跨组织调转'] = msg
-            abnormal_transfer_res.append(before_row)
-            continue
-
-        before_row['调离日期'] = transfer_date
-        before_row['跨组织调转'] = f"跨{dep_level}组织调转"
-
-        # 构造调动后的记录
-        after_row = {
-            '工号': latest['工号'],
-            '姓名': latest['姓名'],
-            '一级组织': latest['调动后一级组织'],
-            '二级组织': latest['调动后二级组织'],
-            '三级组织': latest['调动后三级组织'],
-            '四级组织': latest['调动后部门'],
-            '入职日期': latest['入职日期'],
-            '离职日期': pd.NaT,
-            '调入日期': transfer_date,
-            '调离日期': pd.NaT,
-            '跨组织调转': f"跨{dep_level}组织调转"
-        }
-
-        # 添加两条记录
-        abnormal_transfer_res.extend([before_row, after_row])
-
-        # 合并成新的 DataFrame
-    transfer_final_df = pd.DataFrame(abnormal_transfer_res).reset_index(drop=True)
-    print("异常调动记录处理完成。")
-    # --- 5. 格式化和筛选最终输出列 ---
-    print("正在准备输出异常员工数据...")
+    with span('展开异常调动记录', level=ORG_LEVEL_NAMES[dep_level]) as record:
+        transfer_timeline = build_transfer_timeline(dep_level, df_tiaodong_sorted) if timeline else None
+        transfer_final_df = _merge_abnormal_transfers(dep_level, abnormal_df_final, latest_df, transfer_timeline)
+        record['rows'] = len(transfer_final_df)
 
     # 输出文件
     if output_file:
@@ -291,30 +423,151 @@ def process_abnormal_employee_data(dep_level, all_employees_set, df_tiaodong, ou
     return transfer_final_df
 
 
-if __name__ == "__main__":
-    # 定义文件路径
-    TIAODONG_FILE = "/Users/shengjiang.zw/PycharmProjects/pythonProject/custom_eval/zhao/file/20251211140224.xlsx"
-    ZAI_FILE = "/Users/shengjiang.zw/PycharmProjects/pythonProject/custom_eval/zhao/file/20251211140150.xlsx"
-    LI_FILE = "/Users/shengjiang.zw/PycharmProjects/pythonProject/custom_eval/zhao/file/20251211140206.xlsx"
+# 一次性计算多个组织层级的合并结果：员工表、最新调动索引、异常员工反连接只构建一次，
+# 各层级只重复最后的调动前/调动后拼接。返回 {层级: (员工数据, 异常员工数据)}
+def process_all_levels(all_employees_set, df_tiaodong, df_zai, df_li, dep_levels=(1, 2, 3, 4), timeline=False):
+    with span('初始化员工列表') as record:
+        df_final = _build_employee_base(all_employees_set, df_zai, df_li)
+        record['rows'] = len(df_final)
+
+    with span('构建调动索引', rows=len(df_tiaodong)) as record:
+        df_tiaodong_sorted = sort_transfers(df_tiaodong)
+        latest_index = _latest_transfers(df_tiaodong_sorted)
+        positions = latest_index.index.get_indexer(df_final['工号'])
+        abnormal_df_final, latest_df = _build_abnormal_base(all_employees_set, latest_index)
+        record['abnormal'] = len(abnormal_df_final)
+
+    results = {}
+    for dep_level in dep_levels:
+        with span('展开调动记录', level=ORG_LEVEL_NAMES[dep_level]) as record:
+            transfer_timeline = build_transfer_timeline(dep_level, df_tiaodong_sorted) if timeline else None
+            results[dep_level] = (
+                _merge_latest_transfers(dep_level, df_final, latest_index, positions, transfer_timeline),
+                _merge_abnormal_transfers(dep_level, abnormal_df_final, latest_df, transfer_timeline)
+            )
+            record['rows'] = len(results[dep_level][0])
+    return results
+
+
+# 多层级结果整理为工作簿 sheet：每个层级一个合并结果 sheet 和一个异常员工 sheet
+def all_levels_sheets(results):
+    sheets = {}
+    for dep_level, (employee_df, abnormal_employee_df) in results.items():
+        sheets[ORG_LEVEL_NAMES[dep_level]] = rank_clo(employee_df)
+        sheets[f"{ORG_LEVEL_NAMES[dep_level]}异常员工"] = rank_clo(abnormal_employee_df)
+    return sheets
+
+
+# 增量合并：在上次合并结果基础上，只重算增量文件（调动/在职/离职）涉及的工号，再拼接回原结果
+def process_employee_data_incremental(dep_level, df_previous, df_tiaodong, df_zai, df_li, output_file):
+    with span('增量合并员工数据', rows=len(df_previous)) as record:
+        transfer_final_df = _merge_employee_incremental(dep_level, df_previous, df_tiaodong, df_zai, df_li)
+        record['rows'] = len(transfer_final_df)
+
+    if output_file:
+        output_result_file(transfer_final_df, output_file)
 
-    OUTPUT_FILE = "/Users/shengjiang.zw/PycharmProjects/pythonProject/custom_eval/zhao/file/员工入转调离信息汇总表.xlsx"
-    ABNORMAL_OUTPUT_FILE = "/Users/shengjiang.zw/PycharmProjects/pythonProject/custom_eval/zhao/file/异常员工入转调离信息汇总表.xlsx"
+    return transfer_final_df
 
-    # 当前实际时间: Friday, December 12, 2025
-    print(f"开始处理数据，当前时间参考: Friday, December 12, 2025")
-    print("正在读取源文件...")
-    df_tiaodong, df_zai, df_li = read_file(TIAODONG_FILE, ZAI_FILE, LI_FILE)
 
-    # 创建一个包含所有员工的集合 （在职 + 离职 = 全量员工）
-    all_employees_set = set()
+# 增量合并计算本体
+def _merge_employee_incremental(dep_level, df_previous, df_tiaodong, df_zai, df_li):
+    df_previous = df_previous.reset_index(drop=True)
+    previous_ids = df_previous['工号'].astype(str)
 
-    if not df_zai.empty:
-        all_employees_set.update(df_zai['工号'].dropna().astype(str).tolist())
+    # 增量涉及的工号（调动记录只涉及已知员工，其余属于异常员工）
+    touched_set = collect_employee_ids(df_zai, df_li)
+    if not df_tiaodong.empty:
+        transfer_ids = set(df_tiaodong['工号'].dropna().astype(str))
+        touched_set.update(transfer_ids & (touched_set | set(previous_ids)))
+    touched_mask = previous_ids.isin(touched_set).to_numpy()
+    logger.info(f"增量涉及 {len(touched_set)} 名员工，其中 {len(set(previous_ids[touched_mask]))} 名已在上次结果中。")
+
+    # 工号顺序：沿用上次结果中的顺序，新员工追加在末尾
+    id_order = pd.Index(pd.concat([previous_ids, pd.Series(sorted(touched_set), dtype=object)]).drop_duplicates())
+
+    # 上次结果中每个工号的当前信息（优先取未调离的记录）
+    info_columns = ['姓名', '入职日期'] + ORG_COLUMNS + ['离职日期']
+    df_touched = df_previous[touched_mask]
+    previous_info = (
+        pd.concat([df_touched[df_touched['调离日期'].isna()].iloc[::-1], df_touched.iloc[::-1]])
+        .drop_duplicates('工号', keep='first')
+        .assign(工号=lambda df: df['工号'].astype(str))
+        .set_index('工号')[info_columns]
+    )
+
+    # 增量名单中的信息优先于上次结果
+    delta_info = _employee_join_info(df_zai, df_li)
+    delta_info = delta_info.assign(工号=delta_info['工号'].astype(str)).set_index('工号') if not delta_info.empty \
+        else pd.DataFrame(columns=info_columns)
     if not df_li.empty:
-        all_employees_set.update(df_li['工号'].dropna().astype(str).tolist())
+        delta_leave = df_li[['工号', '离职日期']].dropna(subset=['工号']).drop_duplicates('工号', keep='last')
+        delta_info = delta_info.join(delta_leave.assign(工号=delta_leave['工号'].astype(str)).set_index('工号'), how='outer')
+    base_info = delta_info.reindex(columns=info_columns).combine_first(previous_info).reindex(
+        [emp_id for emp_id in id_order if emp_id in touched_set]
+    )
+
+    df_base = base_info.rename_axis('工号').reset_index()
+    df_base['调离日期'] = pd.NaT
+    df_base['调入日期'] = pd.NaT
+    df_base['跨组织调转'] = ""
+    df_base.index = id_order.get_indexer(df_base['工号'])
+
+    # 有新调动记录：按最新一条重新生成调动前/调动后记录
+    latest_index = build_latest_transfer_index(df_tiaodong)
+    latest_index = latest_index.set_axis(latest_index.index.astype(str))
+    positions = latest_index.index.get_indexer(df_base['工号'])
+    has_transfer = positions >= 0
+    before_df, after_df = _expand_latest_transfers(
+        dep_level, df_base[has_transfer], latest_index.iloc[positions[has_transfer]]
+    )
+
+    # 无新调动但上次结果中已有调动记录：保留原记录，仅更新姓名、入职/离职日期
+    previous_transferred = set(
+        df_touched.loc[df_touched['跨组织调转'].notna() & (df_touched['跨组织调转'] != ''), '工号'].astype(str)
+    ) - set(df_base.loc[has_transfer, '工号'])
+    kept_mask = touched_mask & previous_ids.isin(previous_transferred).to_numpy()
+    df_kept = df_previous[kept_mask].copy()
+    df_kept.index = id_order.get_indexer(previous_ids[kept_mask])
+    kept_info = base_info.reindex(previous_ids[kept_mask])
+    for col in ['姓名', '入职日期', '离职日期']:
+        df_kept[col] = kept_info[col].array
+
+    # 其余增量员工：直接使用合并后的基础信息
+    plain_mask = ~has_transfer & ~df_base['工号'].isin(previous_transferred).to_numpy()
+
+    # 未涉及的员工原样保留
+    df_untouched = df_previous[~touched_mask].copy()
+    df_untouched.index = id_order.get_indexer(previous_ids[~touched_mask])
+
+    frames = [df for df in (df_untouched, df_kept, df_base[plain_mask], before_df, after_df) if not df.empty]
+    transfer_final_df = (
+        pd.concat(frames).sort_index(kind='stable').reset_index(drop=True) if frames
+        else df_previous.iloc[:0].copy()
+    )
+    for col in ['入职日期', '离职日期', '调离日期', '调入日期']:
+        transfer_final_df[col] = parse_dates(transfer_final_df[col], col)
+    return transfer_final_df
+
+
+# 异常员工增量合并：剔除已转为正常员工或有新调动的工号，再追加增量调动中的异常员工
+def process_abnormal_employee_data_incremental(dep_level, df_previous_abnormal, all_employees_set, df_tiaodong,
+                                               output_file):
+    if df_previous_abnormal is None or df_previous_abnormal.empty:
+        df_previous_abnormal = pd.DataFrame(columns=MERGED_COLUMNS)
+    delta_ids = set(df_tiaodong['工号'].dropna().astype(str)) if not df_tiaodong.empty else set()
+    previous_ids = df_previous_abnormal['工号'].astype(str)
+    keep_mask = ~previous_ids.isin(all_employees_set | delta_ids)
 
-    # 调用函数处理数据
-    process_employee_data(3, all_employees_set, df_tiaodong, df_zai, df_li, OUTPUT_FILE)
+    with span('增量合并异常员工数据', rows=len(df_previous_abnormal)) as record:
+        abnormal_delta_df = process_abnormal_employee_data(dep_level, all_employees_set, df_tiaodong, None)
+        frames = [df for df in (df_previous_abnormal[keep_mask], abnormal_delta_df) if not df.empty]
+        transfer_final_df = pd.concat(frames, ignore_index=True) if frames else abnormal_delta_df
+        for col in ['入职日期', '离职日期', '调离日期', '调入日期']:
+            transfer_final_df[col] = parse_dates(transfer_final_df[col], col)
+        record['rows'] = len(transfer_final_df)
 
-    # 调用函数处理异常员工数据
-    process_abnormal_employee_data(3, all_employees_set, df_tiaodong, ABNORMAL_OUTPUT_FILE)
+    if output_file:
+        output_result_file(transfer_final_df, output_file)
+
+    return transfer_final_df
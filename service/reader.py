@@ -0,0 +1,340 @@
+import csv
+import hashlib
+import importlib.util
+import io
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+
+from service.compact import DICTIONARY_GROUPS, compact_frame
+from service.dates import normalize_dates
+from service.instrument import logger
+from service.snapshot import snapshot_enabled, snapshot_key, load_snapshot, save_snapshot
+
+
+# 按文件头识别格式：xlsx（zip）、xls（OLE2）、Parquet，其余按 CSV 处理；与扩展名无关
+FORMAT_SIGNATURES = (
+    (b'PK\x03\x04', 'xlsx'),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'xls'),
+    (b'PAR1', 'parquet'),
+)
+EXCEL_FORMATS = ('xlsx', 'xls')
+
+# CSV 编码：先按 UTF-8（可带 BOM），表头无法解码时按 GB18030（兼容 GBK 导出）
+CSV_ENCODINGS = ('utf-8', 'gb18030')
+# CSV 中可直接解析为时间戳的日期格式，其余格式读为文本后由 dates.normalize_dates 解析
+CSV_TIMESTAMP_FORMATS = ('%Y/%m/%d', '%Y/%m/%d %H:%M:%S')
+# 以字典编码读取的列（组织、工号、姓名等，与 compact.py 的分类列一致）
+DICTIONARY_COLUMNS = {col for group in DICTIONARY_GROUPS for col in group}
+
+
+# 解析 Excel 的进程池：进程内共用一个（首次需要时创建），避免每次读取都重新启动子进程
+_pool_lock = threading.Lock()
+_process_pool = None
+
+
+# 子进程以 spawn 方式启动：Streamlit 服务进程是多线程的，fork 会把其他线程当时持有的锁复制到子进程，可能导致死锁
+def _get_process_pool():
+    global _process_pool
+    with _pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1,
+                                                mp_context=multiprocessing.get_context('spawn'))
+        return _process_pool
+
+
+# 子进程异常退出后进程池不可再用，丢弃后下次读取重新创建
+def _discard_process_pool(pool):
+    global _process_pool
+    with _pool_lock:
+        if _process_pool is pool:
+            _process_pool = None
+    pool.shutdown(wait=False)
+
+
+# 优先使用更快的 calamine 引擎（需安装 python-calamine），否则交给 pandas 默认引擎（openpyxl 只读流式模式）
+def excel_engine():
+    if importlib.util.find_spec('python_calamine') is not None:
+        return 'calamine'
+    return None
+
+
+# 文件名（用于耗时日志），兼容路径与上传文件对象
+def file_label(file):
+    return getattr(file, 'name', None) or str(file)
+
+
+# 文件内容哈希（sha256），兼容路径与上传文件对象；未提供文件时返回空串
+def content_hash(file):
+    if not file:
+        return ''
+    digest = hashlib.sha256()
+    if hasattr(file, 'getbuffer'):
+        digest.update(file.getbuffer())
+    elif hasattr(file, 'read'):
+        file.seek(0)
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+        file.seek(0)
+    else:
+        with open(file, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+# 文件开头的若干字节，兼容路径与上传文件对象
+def _head_bytes(file, size):
+    if hasattr(file, 'getbuffer'):
+        return bytes(file.getbuffer()[:size])
+    if hasattr(file, 'read'):
+        file.seek(0)
+        head = file.read(size)
+        file.seek(0)
+        return head
+    with open(file, 'rb') as f:
+        return f.read(size)
+
+
+# 文件格式：'xlsx' / 'xls' / 'parquet' / 'csv'
+def detect_format(file):
+    head = _head_bytes(file, 8)
+    for signature, fmt in FORMAT_SIGNATURES:
+        if head.startswith(signature):
+            return fmt
+    return 'csv'
+
+
+def _require_pyarrow(fmt):
+    if importlib.util.find_spec('pyarrow') is None:
+        raise ValueError(f"读取 {fmt.upper()} 文件需要安装 pyarrow")
+
+
+# 快照缓存查找：返回 (快照键, 命中的 DataFrame 或 None)；关闭快照缓存时键为 None
+def _lookup_snapshot(file, columns):
+    if not snapshot_enabled():
+        return None, None
+    start = time.perf_counter()
+    key = snapshot_key(content_hash(file), columns)
+    df = load_snapshot(key)
+    if df is not None:
+        elapsed = time.perf_counter() - start
+        logger.info(f"读取文件 {file_label(file)} 命中快照缓存，共 {len(df)} 行 {len(df.columns)} 列，耗时 {elapsed:.2f}s")
+    return key, df
+
+
+def _read_excel(file, columns):
+    wanted = set(columns)
+    return pd.read_excel(
+        file,
+        usecols=lambda col: col in wanted,
+        dtype={'工号': str},
+        engine=excel_engine()
+    )
+
+
+# CSV 表头与编码：返回 (列名列表, 编码)
+def _csv_header(file):
+    line = _head_bytes(file, 1 << 16).split(b'\n', 1)[0]
+    for encoding in CSV_ENCODINGS:
+        try:
+            text = line.decode('utf-8-sig' if encoding == 'utf-8' else encoding)
+        except UnicodeDecodeError:
+            continue
+        return next(csv.reader([text.rstrip('\r')]), []), encoding
+    raise ValueError("无法识别 CSV 文件编码（支持 UTF-8 与 GBK / GB18030）")
+
+
+# pyarrow 多线程解析 CSV：只读取所需列；组织、工号、姓名直接读为字典编码（工号保持文本，保留前导 0），
+# 空字符串视为空值，与 Excel 读取结果一致
+def _read_csv(file, columns):
+    _require_pyarrow('csv')
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+
+    header, encoding = _csv_header(file)
+    wanted = set(columns)
+    include = list(dict.fromkeys(col for col in header if col in wanted))
+    convert_options = pa_csv.ConvertOptions(
+        include_columns=include,
+        column_types={col: pa.dictionary(pa.int32(), pa.string()) for col in include if col in DICTIONARY_COLUMNS},
+        strings_can_be_null=True,
+        timestamp_parsers=[pa_csv.ISO8601, *CSV_TIMESTAMP_FORMATS],
+    )
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    table = pa_csv.read_csv(file, read_options=pa_csv.ReadOptions(encoding=encoding),
+                            convert_options=convert_options)
+    return table.to_pandas()
+
+
+# pyarrow 读取 Parquet：只读取所需列，数值类型的工号转为文本
+def _read_parquet(file, columns):
+    _require_pyarrow('parquet')
+    import pyarrow as pa
+    from pyarrow import parquet as pq
+
+    parquet_file = pq.ParquetFile(file)
+    wanted = set(columns)
+    table = parquet_file.read(columns=[col for col in parquet_file.schema_arrow.names if col in wanted])
+    if '工号' in table.column_names:
+        ids = table.column('工号')
+        if pa.types.is_integer(ids.type) or pa.types.is_floating(ids.type):
+            table = table.set_column(table.column_names.index('工号'), '工号', ids.cast(pa.string()))
+    return table.to_pandas()
+
+
+# 按文件头识别格式并解析，写入快照缓存
+def _parse_table(file, columns, key, label=None):
+    fmt = detect_format(file)
+    if hasattr(file, 'seek'):
+        file.seek(0)
+
+    start = time.perf_counter()
+    if fmt in EXCEL_FORMATS:
+        df = _read_excel(file, columns)
+    elif fmt == 'parquet':
+        df = _read_parquet(file, columns)
+    else:
+        df = _read_csv(file, columns)
+    # 日期列：每列识别一次格式后整列解析（含 Excel 序列号、混合格式），无法识别的值记为空值并告警
+    df, date_report = normalize_dates(df)
+    # 组织、工号、姓名转为分类编码：快照、进程间传递与后续处理都只携带整数编码
+    df = compact_frame(df)
+    elapsed = time.perf_counter() - start
+
+    logger.info(f"读取文件 {label or file_label(file)}（{fmt}）完成，共 {len(df)} 行 {len(df.columns)} 列，耗时 {elapsed:.2f}s")
+    for row in date_report:
+        if row['无法解析']:
+            logger.warning(f"文件 {label or file_label(file)} 的“{row['列']}”列有 {row['无法解析']} 个无法识别的日期，"
+                           f"已按空值处理，例如：{row['示例']}")
+
+    if key is not None:
+        try:
+            save_snapshot(key, df)
+        except OSError as e:
+            logger.warning(f"写入快照缓存失败: {e}")
+    return df
+
+
+# 子进程中解析：上传文件对象以字节形式传入
+def _parse_worker(source, columns, key, label):
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    return _parse_table(source, columns, key, label)
+
+
+# 只读取所需列的 Excel / CSV / Parquet 数据（按文件头识别格式）：工号按字符串读入，日期列解析为 datetime，
+# 组织、工号、姓名为分类编码（见 compact.py）。同一文件（内容哈希相同）再次读取时直接加载本地快照
+def read_table_columns(file, columns):
+    key, df = _lookup_snapshot(file, columns)
+    if df is not None:
+        return df
+    return _parse_table(file, columns, key)
+
+
+# 导出文件的快照：df 为刚导出的文件 file 的内容，直接作为“按 columns 读取该文件”的解析结果写入快照缓存，
+# 之后读取该文件（如增量合并读取上次导出的合并结果）直接加载快照，省去 xlsx 解析。
+# 与解析结果保持一致：只保留读取的列，空字符串（导出为空白单元格）记为空值，再转为紧凑表示
+def save_table_snapshot(file, columns, df):
+    if not snapshot_enabled():
+        return
+    wanted = set(columns)
+    df = df[[col for col in df.columns if col in wanted]]
+    texts = {}
+    for col in df.columns:
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # 分类列只处理字典：去掉空串与未使用的取值，compact_frame 按剩余取值重建字典
+            if '' in values.cat.categories:
+                values = values.cat.remove_categories([''])
+            texts[col] = values.cat.remove_unused_categories()
+        elif values.dtype == object:
+            texts[col] = values.where(values != '')
+    df = compact_frame(df.assign(**texts))
+    try:
+        save_snapshot(snapshot_key(content_hash(file), columns), df)
+    except OSError as e:
+        logger.warning(f"写入快照缓存失败: {e}")
+
+
+# 文件转为可传给子进程的形式：路径原样传递，上传文件对象取字节
+def _picklable_source(file):
+    if hasattr(file, 'getbuffer'):
+        return bytes(file.getbuffer())
+    if hasattr(file, 'read'):
+        file.seek(0)
+        data = file.read()
+        file.seek(0)
+        return data
+    return file
+
+
+# 待解析的 Excel 提交到共用进程池，返回 (进程池, {future: (序号, 文件)})；进程池已损坏时重建一次
+def _submit_parse(pending):
+    for retry in (True, False):
+        pool = _get_process_pool()
+        try:
+            return pool, {
+                pool.submit(_parse_worker, _picklable_source(file), columns, key, file_label(file)): (i, file)
+                for i, file, columns, key in pending
+            }
+        except BrokenProcessPool:
+            _discard_process_pool(pool)
+            if not retry:
+                raise
+
+
+# 并行读取多个文件：requests 为 [(文件, 列)]，返回与之对应的 DataFrame 列表。
+# 快照命中的直接加载；未命中的 Excel 各自是独立且 CPU 密集的 xlsx 解析，放到共用的进程池并行执行，
+# 总耗时约等于最大文件的解析时间。只有一个 Excel 需要解析或只有一个 CPU 时在当前进程顺序解析。
+# CSV / Parquet 由 pyarrow 多线程解析，始终在当前进程中读取（省去向子进程传递文件字节）。
+# 任一文件失败时，汇总所有失败文件及原因后抛出 ValueError
+def read_tables(requests, max_workers=None):
+    results = [None] * len(requests)
+    pending = []
+    local = []
+    errors = []
+    for i, (file, columns) in enumerate(requests):
+        try:
+            key, df = _lookup_snapshot(file, columns)
+            fmt = detect_format(file) if df is None else None
+        except OSError as e:
+            errors.append(f"{file_label(file)}: {e}")
+            continue
+        if df is not None:
+            results[i] = df
+        elif fmt in EXCEL_FORMATS:
+            pending.append((i, file, columns, key))
+        else:
+            local.append((i, file, columns, key))
+
+    workers = min(len(pending), max_workers or os.cpu_count() or 1)
+    if workers <= 1:
+        local = pending + local
+        pending = []
+
+    pool, futures = _submit_parse(pending) if pending else (None, {})
+    # 子进程解析 Excel 的同时，在当前进程读取其余文件
+    for i, file, columns, key in local:
+        try:
+            results[i] = _parse_table(file, columns, key)
+        except Exception as e:
+            errors.append(f"{file_label(file)}: {e}")
+    for future, (i, file) in futures.items():
+        try:
+            results[i] = future.result()
+        except BrokenProcessPool as e:
+            _discard_process_pool(pool)
+            errors.append(f"{file_label(file)}: {e}")
+        except Exception as e:
+            errors.append(f"{file_label(file)}: {e}")
+
+    if errors:
+        raise ValueError("读取文件失败：\n" + "\n".join(errors))
+    return results
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+from service.columns import ORG_COLUMNS, ORG_LEVEL_NAMES
+
+
+# 组织名称缺失时的展示值
+MISSING_ORG_LABEL = '(空)'
+
+
+# 逐层编码组织路径：第 k 层编码唯一对应 (一级组织, ..., 第 k 级组织) 路径，
+# 组织名称只在 factorize 时比较一次，之后的分组汇总都基于整数编码
+def org_path_codes(df):
+    codes = np.zeros(len(df), dtype=np.int64)
+    path_codes = []
+    for col in ORG_COLUMNS:
+        values = df[col] if col in df.columns else pd.Series(np.nan, index=df.index)
+        value_codes, uniques = pd.factorize(values, use_na_sentinel=False)
+        codes, _ = pd.factorize(codes * max(len(uniques), 1) + value_codes)
+        path_codes.append(codes)
+    return path_codes
+
+
+# 各分组代表行的组织名称（只展开代表行，组织列为分类编码时不必整列转为字符串），缺失显示为 MISSING_ORG_LABEL
+def _org_labels(values, rows):
+    labels = values.iloc[rows].astype(object)
+    return labels.where(labels.notna(), MISSING_ORG_LABEL).to_numpy()
+
+
+# 分组去重计数：每组中 active 为真的不同员工数
+def _distinct_count(group_codes, n_groups, emp_codes, n_emps, active):
+    pairs = pd.unique(group_codes[active] * n_emps + emp_codes[active])
+    return np.bincount(pairs // n_emps, minlength=n_groups)
+
+
+# 组织层级汇总（grouping sets）：一次编码后按 合计 / 一级 / 二级 / 三级 / 四级组织 分别汇总，
+# sum_columns 求和，headcount_columns 为 {输出列: 月数列}，统计该列大于 0 的不同工号数。
+# 汇总行在前、下级明细在后，未参与汇总的组织列为空
+def org_rollup(df, sum_columns, headcount_columns):
+    n = len(df)
+    path_codes = org_path_codes(df)
+    # 缺失工号编码为 -1，不计入人数
+    emp_codes, emp_uniques = pd.factorize(df['工号'])
+    n_emps = max(len(emp_uniques), 1)
+    values = {col: df[col].to_numpy(dtype=float) for col in sum_columns}
+    actives = {
+        col: (df[months_col].to_numpy(dtype=float) > 0) & (emp_codes >= 0)
+        for col, months_col in headcount_columns.items()
+    }
+
+    # 合计行视为只有一个分组（编码全为 0）
+    levels = [('合计', np.zeros(n, dtype=np.int64), [])]
+    for i, col in enumerate(ORG_COLUMNS):
+        levels.append((ORG_LEVEL_NAMES[i + 1], path_codes[i], ORG_COLUMNS[:i + 1]))
+
+    org_frame = df.reindex(columns=ORG_COLUMNS)
+    frames = []
+    for level_name, group_codes, label_columns in levels:
+        n_groups = int(group_codes.max()) + 1 if n else 0
+        # factorize 按首次出现顺序编码，各编码首次出现的行即为该分组的代表行
+        first_rows = np.flatnonzero(~pd.Series(group_codes).duplicated().to_numpy())
+
+        level_df = pd.DataFrame({'汇总层级': level_name}, index=range(n_groups))
+        for col in ORG_COLUMNS:
+            level_df[col] = _org_labels(org_frame[col], first_rows) if col in label_columns else None
+        for col, active in actives.items():
+            level_df[col] = _distinct_count(group_codes, n_groups, emp_codes, n_emps, active)
+        for col, col_values in values.items():
+            level_df[col] = np.round(np.bincount(group_codes, weights=col_values, minlength=n_groups), 2)
+        frames.append(level_df)
+
+    rollup_df = pd.concat(frames, ignore_index=True)
+    return rollup_df.sort_values(ORG_COLUMNS, na_position='first', kind='stable').reset_index(drop=True)
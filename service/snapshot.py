@@ -0,0 +1,137 @@
+import hashlib
+import importlib.util
+import os
+import pickle
+
+import numpy as np
+
+from service.instrument import logger
+
+# 快照缓存：已解析的花名册按“文件内容哈希 + 读取列”保存为列式文件，再次读取同一文件时直接加载
+# HR_TOOL_SNAPSHOT_CACHE=0 关闭；HR_TOOL_CACHE_DIR 指定目录；HR_TOOL_CACHE_MAX_MB 指定目录容量上限
+SNAPSHOT_VERSION = 3
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'hr_tool', 'snapshots')
+DEFAULT_CACHE_MAX_MB = 1024
+
+FEATHER_SUFFIX = '.feather'
+PICKLE_SUFFIX = '.pkl'
+
+
+def snapshot_enabled():
+    return os.environ.get('HR_TOOL_SNAPSHOT_CACHE', '1') != '0'
+
+
+def cache_dir():
+    return os.environ.get('HR_TOOL_CACHE_DIR') or DEFAULT_CACHE_DIR
+
+
+def cache_max_bytes():
+    return int(float(os.environ.get('HR_TOOL_CACHE_MAX_MB', DEFAULT_CACHE_MAX_MB)) * 1024 * 1024)
+
+
+# 有 pyarrow 时使用未压缩的 Feather（可内存映射读取），否则使用 pickle
+def _feather_available():
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+# 快照键：文件内容哈希 + 读取列 + 快照格式版本
+def snapshot_key(file_hash, columns):
+    digest = hashlib.sha256()
+    digest.update(file_hash.encode())
+    digest.update('\x1f'.join(columns).encode())
+    digest.update(str(SNAPSHOT_VERSION).encode())
+    return digest.hexdigest()
+
+
+# 删除快照文件，文件已被其他进程删除（淘汰或替换）时忽略
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# 读取快照，未命中返回 None；命中时刷新修改时间，作为 LRU 淘汰依据
+# 快照目录可能由多个进程共用：读取途中文件被其他进程删除时视为未命中，由调用方重新解析
+def load_snapshot(key):
+    for suffix in (FEATHER_SUFFIX, PICKLE_SUFFIX):
+        path = os.path.join(cache_dir(), key + suffix)
+        if not os.path.exists(path):
+            continue
+        try:
+            if suffix == FEATHER_SUFFIX:
+                from pyarrow import feather
+                df = feather.read_table(path, memory_map=True).to_pandas()
+                # Arrow 中的空值在 object 列中会还原为 None，统一为 NaN 与 Excel 读取结果保持一致
+                object_cols = df.select_dtypes('object').columns
+                if len(object_cols):
+                    df[object_cols] = df[object_cols].fillna(np.nan)
+            else:
+                with open(path, 'rb') as f:
+                    df = pickle.load(f)
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            logger.warning(f"快照 {path} 读取失败，将重新解析: {e}")
+            _remove_quietly(path)
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return df
+    return None
+
+
+# 写入快照（先写临时文件再原子替换），随后按容量上限淘汰最久未使用的快照
+def save_snapshot(key, df):
+    directory = cache_dir()
+    os.makedirs(directory, exist_ok=True)
+    df = df.reset_index(drop=True)
+
+    path = None
+    if _feather_available():
+        from pyarrow import feather
+        path = os.path.join(directory, key + FEATHER_SUFFIX)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            feather.write_feather(df, tmp_path, compression='uncompressed')
+        except Exception:
+            # 混合类型的 object 列无法转换为 Arrow，退回 pickle
+            path = None
+            _remove_quietly(tmp_path)
+    if path is None:
+        path = os.path.join(directory, key + PICKLE_SUFFIX)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+    evict_snapshots()
+
+
+# 按最近使用时间（mtime）淘汰快照，直到目录总大小不超过上限
+def evict_snapshots(max_bytes=None):
+    directory = cache_dir()
+    if max_bytes is None:
+        max_bytes = cache_max_bytes()
+    if not os.path.isdir(directory):
+        return
+
+    entries = []
+    for name in os.listdir(directory):
+        if not name.endswith((FEATHER_SUFFIX, PICKLE_SUFFIX)):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        _remove_quietly(path)
+        total -= size
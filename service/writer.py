@@ -0,0 +1,54 @@
+import os
+import tempfile
+
+import xlsxwriter
+
+from service.instrument import span
+
+
+# 每批写入的行数（constant_memory 模式下只需保留当前批次的数据）
+CHUNK_ROWS = 10000
+
+
+# 逐批取出行数据：NaN/NaT 转为 None（写为空白单元格），numpy 标量转为 Python 对象
+def _iter_rows(df, chunk_rows):
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows].astype(object)
+        chunk = chunk.where(chunk.notna(), None)
+        yield from chunk.itertuples(index=False, name=None)
+
+
+# 以 xlsxwriter constant_memory 模式流式写出 Excel，sheets 为 {sheet 名: DataFrame}
+def write_excel(sheets, target, chunk_rows=CHUNK_ROWS):
+    with span('导出 Excel', rows=sum(len(df) for df in sheets.values()), sheets=len(sheets)):
+        _write_workbook(sheets, target, chunk_rows)
+
+
+def _write_workbook(sheets, target, chunk_rows):
+    workbook = xlsxwriter.Workbook(target, {
+        'constant_memory': True,
+        'default_date_format': 'yyyy-mm-dd',
+        'remove_timezone': True,
+        'nan_inf_to_errors': True,
+    })
+    try:
+        header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center'})
+        for sheet_name, df in sheets.items():
+            worksheet = workbook.add_worksheet(sheet_name)
+            worksheet.write_row(0, 0, [str(col) for col in df.columns], header_format)
+            for row_idx, row in enumerate(_iter_rows(df, chunk_rows), start=1):
+                worksheet.write_row(row_idx, 0, row)
+    finally:
+        workbook.close()
+
+
+# 导出为 Excel 字节：先流式写入磁盘临时文件，再一次性读回，避免 BytesIO + getvalue 的重复拷贝
+def excel_bytes(sheets, chunk_rows=CHUNK_ROWS):
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        write_excel(sheets, path, chunk_rows)
+        with open(path, 'rb') as f:
+            return f.read()
+    finally:
+        os.remove(path)
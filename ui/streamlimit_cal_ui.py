@@ -1,8 +1,10 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import pandas as pd
+import io
 import sys
 import os
-from io import BytesIO
+import threading
 import traceback
 
 
@@ -11,8 +13,21 @@ project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
-from service.merge_info import read_file, process_employee_data, process_abnormal_employee_data, rank_clo
-from service.cal_fee import cal_fee
+from service.merge_info import (
+    read_file, read_previous_result, collect_employee_ids, rank_clo,
+    process_employee_data, process_abnormal_employee_data,
+    process_employee_data_incremental, process_abnormal_employee_data_incremental,
+    process_all_levels, all_levels_sheets, save_result_snapshot
+)
+from service.cal_fee import cal_fee, cal_fee_years, fee_rollup
+from service.compact import compact_frames, memory_report
+from service.instrument import configure_logging, logger, spans_table
+from service.jobs import (
+    DONE, FAILED, PENDING, submit_job, cancel_job, collect_job, job_finished, job_progress, job_elapsed,
+    queue_position, executor_status, jobs_table
+)
+from service.reader import content_hash
+from service.writer import excel_bytes
 
 
 ORG_LEVEL_MAP = {
@@ -22,39 +37,335 @@ ORG_LEVEL_MAP = {
     "四级组织": 4
 }
 
+# 结果缓存：最多保留的条目数与过期时间（秒）
+CACHE_MAX_ENTRIES = 16
+CACHE_TTL_SECONDS = 60 * 60
+
+# 上传文件类型：Excel / CSV / Parquet（实际格式按文件头识别）
+UPLOAD_TYPES = ["xlsx", "xls", "csv", "parquet"]
+
+# 后台任务进度刷新间隔（秒），以及侧边栏任务队列的刷新间隔
+JOB_POLL_SECONDS = 0.5
+JOB_ADMIN_POLL_SECONDS = 2
+
+# 各类计算的顶层阶段数（service 层 span，用于估算进度）：
+# 读取文件 + 初始化员工列表 / 构建调动索引 / 展开调动记录 + 构建异常员工索引 / 展开异常调动记录
+MERGE_STAGES = 6
+# 读取文件 + 增量合并员工数据 + 增量合并异常员工数据
+MERGE_INCREMENTAL_STAGES = 3
+# 读取文件 + 初始化员工列表 + 构建调动索引 + 每个层级一次展开调动记录
+MERGE_ALL_LEVELS_STAGES = 3 + len(ORG_LEVEL_MAP)
+# 读取文件 + 计算经费 + 组织汇总
+BUDGET_STAGES = 3
+
+configure_logging()
+
+
+# 合并函数（按上传文件内容哈希 + 组织层级缓存结果）
+# 提供上次合并结果时为增量模式：三个花名册视为增量文件，只重算其中涉及的工号
+# timeline=True 时展开每名员工的完整调动时间线（暂不支持增量模式）
+def merge_employee_files(onboard, resigned, transferred, org_level, previous=None, previous_abnormal=None,
+                         timeline=False):
+    if not transferred and not previous:
+        raise ValueError("请上传调转员工花名册。")
+    if timeline and previous:
+        raise ValueError("完整调动时间线暂不支持增量合并，请取消勾选或移除上次合并结果。")
+
+    return _merge_employee_files_cached(
+        content_hash(onboard), content_hash(resigned), content_hash(transferred), org_level,
+        content_hash(previous), content_hash(previous_abnormal), timeline,
+        onboard, resigned, transferred, previous, previous_abnormal
+    )
+
+
+# 以下划线开头的参数不参与缓存键计算，缓存键只由文件哈希与组织层级组成
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def _merge_employee_files_cached(onboard_hash, resigned_hash, transferred_hash, org_level,
+                                 previous_hash, previous_abnormal_hash, timeline,
+                                 _onboard, _resigned, _transferred, _previous, _previous_abnormal):
+    if _previous:
+        return _merge_employee_files_incremental(_onboard, _resigned, _transferred, org_level,
+                                                 _previous, _previous_abnormal)
+    return _merge_employee_files(_onboard, _resigned, _transferred, org_level, timeline)
 
-# 合并函数
-def merge_employee_files(onboard, resigned, transferred, org_level):
+
+# 实际的合并计算
+def _merge_employee_files(onboard, resigned, transferred, org_level, timeline=False):
     # 当前实际时间: Friday, December 12, 2025
-    print(f"开始处理数据")
-    print(f"正在读取源文件... {onboard} \n {resigned} \n {transferred} \n {org_level}")
+    logger.info(f"开始合并数据，组织层级 {org_level}")
     df_tiaodong, df_zai, df_li = read_file(transferred, onboard, resigned)
 
     # 创建一个包含所有员工的集合 （在职 + 离职 = 全量员工）
-    all_employees_set = set()
-
-    if not df_zai.empty:
-        all_employees_set.update(df_zai['工号'].dropna().astype(str).tolist())
-    if not df_li.empty:
-        all_employees_set.update(df_li['工号'].dropna().astype(str).tolist())
+    all_employees_set = collect_employee_ids(df_zai, df_li)
 
     # 调用函数处理数据
-    employee_df = process_employee_data(org_level, all_employees_set, df_tiaodong, df_zai, df_li, None)
+    employee_df = process_employee_data(org_level, all_employees_set, df_tiaodong, df_zai, df_li, None,
+                                        timeline=timeline)
     employee_df = rank_clo(employee_df)
 
     # 调用函数处理异常员工数据
-    abnormal_employee_df = process_abnormal_employee_data(org_level, all_employees_set, df_tiaodong, None)
+    abnormal_employee_df = process_abnormal_employee_data(org_level, all_employees_set, df_tiaodong, None,
+                                                          timeline=timeline)
     abnormal_employee_df = rank_clo(abnormal_employee_df)
     return employee_df, abnormal_employee_df
 
 
+# 增量合并计算
+def _merge_employee_files_incremental(onboard, resigned, transferred, org_level, previous, previous_abnormal):
+    logger.info(f"开始增量合并数据，组织层级 {org_level}")
+    df_tiaodong, df_zai, df_li = read_file(transferred, onboard, resigned, compact=False)
+    df_previous = read_previous_result(previous)
+    df_previous_abnormal = read_previous_result(previous_abnormal) if previous_abnormal else pd.DataFrame()
+    # 增量文件与上次结果共用同一套字典，拼接后仍为分类编码
+    df_tiaodong, df_zai, df_li, df_previous, df_previous_abnormal = compact_frames(
+        df_tiaodong, df_zai, df_li, df_previous, df_previous_abnormal
+    )
+
+    # 全量员工 = 上次结果中的员工 + 增量在职/离职员工
+    all_employees_set = set(df_previous['工号'].dropna().astype(str)) | collect_employee_ids(df_zai, df_li)
+
+    employee_df = process_employee_data_incremental(org_level, df_previous, df_tiaodong, df_zai, df_li, None)
+    employee_df = rank_clo(employee_df)
+
+    abnormal_employee_df = process_abnormal_employee_data_incremental(
+        org_level, df_previous_abnormal, all_employees_set, df_tiaodong, None
+    )
+    abnormal_employee_df = rank_clo(abnormal_employee_df)
+    return employee_df, abnormal_employee_df
+
+
+# 全部组织层级一次合并（按上传文件内容哈希缓存），返回 {sheet 名: DataFrame}
+def merge_employee_files_all_levels(onboard, resigned, transferred, timeline=False):
+    if not transferred:
+        raise ValueError("请上传调转员工花名册。")
+
+    return _merge_employee_files_all_levels_cached(
+        content_hash(onboard), content_hash(resigned), content_hash(transferred), timeline,
+        onboard, resigned, transferred
+    )
+
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def _merge_employee_files_all_levels_cached(onboard_hash, resigned_hash, transferred_hash, timeline,
+                                            _onboard, _resigned, _transferred):
+    logger.info("开始合并数据（全部组织层级）")
+    df_tiaodong, df_zai, df_li = read_file(_transferred, _onboard, _resigned)
+    all_employees_set = collect_employee_ids(df_zai, df_li)
+
+    results = process_all_levels(all_employees_set, df_tiaodong, df_zai, df_li, tuple(ORG_LEVEL_MAP.values()),
+                                 timeline=timeline)
+    return all_levels_sheets(results)
+
+
 def calculate_budget(cal_file, target_year):
     if not cal_file:
         raise ValueError("请上传员工入转调离数据文件。")
 
-    df = cal_fee(cal_file, target_year)
+    return _calculate_budget_cached(content_hash(cal_file), target_year, cal_file)
+
+
+# 按文件哈希 + 核算年度缓存经费计算结果
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def _calculate_budget_cached(cal_file_hash, target_year, _cal_file):
+    df = cal_fee(_cal_file, target_year)
+
+    return df, df["年度经费"].sum(), fee_rollup(df)
+
+
+# 多年度经费计算，返回明细宽表、各年度总经费与组织汇总
+def calculate_budget_years(cal_file, start_year, end_year):
+    if not cal_file:
+        raise ValueError("请上传员工入转调离数据文件。")
+    if start_year > end_year:
+        raise ValueError("起始年度不能晚于结束年度。")
+
+    return _calculate_budget_years_cached(content_hash(cal_file), start_year, end_year, cal_file)
+
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def _calculate_budget_years_cached(cal_file_hash, start_year, end_year, _cal_file):
+    years = list(range(start_year, end_year + 1))
+    df = cal_fee_years(_cal_file, years)
+
+    totals = {year: df[f"{year}年度经费"].sum() for year in years}
+    return df, totals, fee_rollup(df, years)
+
+
+# 后台合并任务（在任务线程中执行）：返回 (需要写入 session_state 的结果, 完成提示)
+def run_merge_job(all_levels, onboard, resigned, transferred, org_level, previous, previous_abnormal, timeline):
+    if all_levels:
+        if previous:
+            raise ValueError("全部组织层级模式暂不支持增量合并，请取消勾选或移除上次合并结果。")
+        sheets = merge_employee_files_all_levels(onboard, resigned, transferred, timeline)
+        summary = "，".join(f"{name} {len(df)} 条" for name, df in sheets.items())
+        return {'all_levels_sheets': sheets}, f"✅ 合并成功！{summary}。"
 
-    return df, df["年度经费"].sum()
+    employee_df, abnormal_employee_df = merge_employee_files(onboard, resigned, transferred, org_level,
+                                                             previous, previous_abnormal, timeline)
+    if not abnormal_employee_df.empty:
+        message = f"✅ 合并成功！员工入转调离信息共 {len(employee_df)} 条记录，异常员工入转调离信息共 {len(abnormal_employee_df)} 条记录。"
+    else:
+        message = f"✅ 合并成功！员工入转调离信息共 {len(employee_df)} 条记录。"
+    return {'employee_df': employee_df, 'abnormal_employee_df': abnormal_employee_df}, message
+
+
+# 后台经费计算任务（在任务线程中执行）：返回 (需要写入 session_state 的结果, 完成提示)
+def run_budget_job(cal_file, start_year, end_year=None):
+    if end_year is not None:
+        detail_df, totals, rollup_df = calculate_budget_years(cal_file, start_year, end_year)
+        summary = "，".join(f"{year} 年 **{total:,.2f} 元**" for year, total in totals.items())
+        return ({'budget_sheets': {"经费明细": detail_df, "组织汇总": rollup_df}, 'total_budget': totals},
+                f"✅ 计算完成！各年度总经费：{summary}")
+
+    detail_df, total, rollup_df = calculate_budget(cal_file, start_year)
+    return ({'budget_sheets': {"经费明细": detail_df, "组织汇总": rollup_df}, 'total_budget': total},
+            f"✅ 计算完成！年度总经费：**{total:,.2f} 元**")
+
+
+# 后台任务线程沿用提交时会话的 ScriptRunContext：任务中调用的 st.cache_data 函数需要它，否则每次访问缓存都会告警
+def with_session_context(fn):
+    ctx = get_script_run_ctx()
+
+    def run(*args, **kwargs):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return fn(*args, **kwargs)
+
+    return run
+
+
+# 任务是否仍在运行（按钮据此禁用，避免重复提交）
+def job_running(job_key):
+    job = st.session_state.get(job_key)
+    return job is not None and not job_finished(job)
+
+
+# 运行中任务的进度片段：定时刷新当前阶段与进度，可取消；任务结束后整页重跑以展示结果
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def render_job_progress(job_key):
+    job = st.session_state[job_key]
+    if job_finished(job):
+        st.rerun()
+
+    if job['status'] == PENDING:
+        st.progress(0.0, text=f"⏳ {job['label']}：排队中（前面还有 {queue_position(job)} 个任务）")
+    else:
+        progress = job_progress(job)
+        stage = job['stage'] or "准备中"
+        st.progress(progress or 0.0, text=f"⏳ {job['label']}：{stage}（已用时 {job_elapsed(job):.1f}s）")
+    if job['subscribers'] > 1:
+        st.caption(f"相同输入的计算已在进行，{job['subscribers']} 个会话共用本次结果")
+    if job['cancel_requested']:
+        st.caption("正在取消，当前阶段结束后停止…")
+    elif st.button("⏹️ 取消", key=f"{job_key}_cancel"):
+        if cancel_job(job):
+            st.caption("正在取消，当前阶段结束后停止…")
+        else:
+            # 其他会话仍在等待同一计算：只是本会话不再等待
+            del st.session_state[job_key]
+            st.toast("已停止等待，其他用户提交的相同计算仍在进行")
+            st.rerun()
+
+
+# 展示后台任务：运行中显示进度；结束后取走结果，把结果、完成提示与阶段耗时写入 session_state（每个会话只取一次），并展示结果提示
+# 任务可能由多个会话共用，结果只读取、不修改；所有会话取走后任务不再持有结果
+def render_job(job_key, spans_key, show_traceback=False):
+    job = st.session_state.get(job_key)
+    if job is None:
+        return
+    if not job_finished(job):
+        render_job_progress(job_key)
+        return
+
+    if st.session_state.get(f"{job_key}_collected") != job['id']:
+        result = collect_job(job)
+        if job['status'] == DONE:
+            st.session_state.update(result[0])
+            st.session_state[f"{job_key}_message"] = result[1]
+        st.session_state[spans_key] = job['spans']
+        st.session_state[f"{job_key}_collected"] = job['id']
+
+    if job['status'] == DONE:
+        st.success(st.session_state[f"{job_key}_message"])
+    elif job['status'] == FAILED:
+        st.error(f"❌ {job['label']}失败：{job['traceback'] if show_traceback else job['error']}")
+    else:
+        st.info(f"已取消{job['label']}（耗时 {job_elapsed(job):.1f}s）。")
+
+
+# 侧边栏任务队列：本服务进程内所有会话的排队 / 运行中任务及资源占用
+@st.fragment(run_every=JOB_ADMIN_POLL_SECONDS)
+def render_job_admin():
+    status = executor_status()
+    memory = "未知" if status['memory_mb'] is None else f"{status['memory_mb']:,.0f} MB"
+    st.caption(f"同时运行上限 {status['max_jobs']} 个（环境变量 HR_TOOL_MAX_JOBS），"
+               f"运行中 {status['running']} 个，排队 {status['pending']} 个；进程内存 {memory}")
+    rows = jobs_table()
+    if rows:
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+        st.caption("CPU 与内存峰值均为近似值：CPU 只计任务线程（不含读取文件的子进程），"
+                   "内存峰值按整个进程统计（需 HR_TOOL_TRACE_MEMORY=1），多个任务同时运行时会互相计入")
+    else:
+        st.caption("暂无任务")
+
+
+# 下载按钮的延迟生成函数：用户点击下载时才导出 Excel，
+# 字节与对应结果一起保存在 session_state 中，结果对象变化后自动重新生成
+# 不指定 sheet_name 时，结果本身为 {sheet 名: DataFrame}
+# result_snapshot=True 时（单表合并结果）导出的同时写入结果快照，下载的文件作为上次结果上传做增量合并时直接加载
+def deferred_excel(result_key, sheet_name=None, result_snapshot=False):
+    result = st.session_state[result_key]
+    sheets = result if sheet_name is None else {sheet_name: result}
+    download_cache = st.session_state.setdefault('download_cache', {})
+
+    # 该函数由 Streamlit 在下载请求线程中调用，不能访问 session_state，只使用闭包中的对象
+    def build():
+        cached = download_cache.get(result_key)
+        if cached is None or cached[0] is not result:
+            data = excel_bytes(sheets)
+            if result_snapshot:
+                save_result_snapshot(io.BytesIO(data), result)
+            download_cache[result_key] = (result, data)
+        return download_cache[result_key][1]
+
+    return build
+
+
+# 本次运行的阶段耗时明细；没有阶段记录说明结果直接取自缓存
+def render_spans(spans_key):
+    if spans_key not in st.session_state:
+        return
+    spans = st.session_state[spans_key]
+    with st.expander("⏱️ 本次运行耗时明细"):
+        if spans:
+            st.caption(f"总耗时 {sum(record['seconds'] for record in spans if record['depth'] == 0):.2f}s；"
+                       "设置环境变量 HR_TOOL_TRACE_MEMORY=1 可记录各阶段内存峰值（按进程统计的近似值）")
+            st.dataframe(spans_table(spans), use_container_width=True, hide_index=True)
+        else:
+            st.caption("结果命中缓存，本次未重新计算")
+
+
+# 当前保存在 session_state 中的结果的内存占用，results 为 {结果键: 展示名称}；
+# 结果为 {sheet 名: DataFrame} 时逐个 sheet 列出
+def render_memory_report(results):
+    frames = {}
+    for key, label in results.items():
+        result = st.session_state.get(key)
+        if isinstance(result, dict):
+            frames.update(result)
+        elif result is not None:
+            frames[label] = result
+    if not frames:
+        return
+    with st.expander("🧠 结果内存占用"):
+        st.caption("组织、工号、姓名以分类编码保存，字典由同一次计算的各结果共用；字符串只在导出 Excel 时生成")
+        st.dataframe(memory_report(frames), use_container_width=True, hide_index=True)
+
+
+# 结果更新时清除其已缓存的下载字节
+def clear_download_cache(*result_keys):
+    download_cache = st.session_state.setdefault('download_cache', {})
+    for key in result_keys:
+        download_cache.pop(key, None)
 
 
 def render_budget_balance_tab():
@@ -186,102 +497,149 @@ if tab_options[selected_tab] != st.query_params.get("active_tab"):
     st.query_params["active_tab"] = tab_options[selected_tab]
 
 
+with st.sidebar.expander("🛠️ 后台任务队列"):
+    render_job_admin()
+
 # 渲染对应内容
 if tab_options[selected_tab] == "tab1":
     st.subheader("📎 上传员工花名册")
-    st.caption("请上传 Excel 文件（.xlsx 或 .xls）")
+    st.caption("请上传 Excel（.xlsx 或 .xls）、CSV 或 Parquet 文件")
     st.query_params["active_tab"] = "tab1"
 
     col1, col2, col3 = st.columns(3)
     with col1:
         # 标签文字已作为按钮主文字，无额外 label
-        onboard_file = st.file_uploader("**在职员工花名册**", type=["xlsx", "xls"])
+        onboard_file = st.file_uploader("**在职员工花名册**", type=UPLOAD_TYPES)
     with col2:
-        resigned_file = st.file_uploader("**离职员工花名册**", type=["xlsx", "xls"])
+        resigned_file = st.file_uploader("**离职员工花名册**", type=UPLOAD_TYPES)
     with col3:
-        transferred_file = st.file_uploader("**调转员工花名册**", type=["xlsx", "xls"])
+        transferred_file = st.file_uploader("**调转员工花名册**", type=UPLOAD_TYPES)
 
     st.subheader("🏢 选择统计组织层级")
     st.caption("明确合并统计组织层级，自动忽略原组织之间的调转")
+    all_levels = st.checkbox("同时计算全部组织层级（只读取一次，导出为每个层级一个 sheet 的工作簿）")
     org_level = st.selectbox(
         "组织层级",  # 这个 label 会显示在下拉框上方（Streamlit 必需）
         options=list(ORG_LEVEL_MAP.keys()),
-        index=0
+        index=0,
+        disabled=all_levels
     )
+    timeline = st.checkbox("展开完整调动时间线（每次跨组织调动都生成一个组织区段，而不只取最新一条）")
+
+    with st.expander("🔁 增量合并（可选）"):
+        st.caption("上传上次导出的合并结果后，上方花名册按本期增量文件处理，只重算其中涉及的工号")
+        previous_file = st.file_uploader("**上次员工入转调离数据**", type=UPLOAD_TYPES)
+        previous_abnormal_file = st.file_uploader("**上次异常员工入转调离数据**", type=UPLOAD_TYPES)
 
     st.write("")
-    if st.button("开始合并", use_container_width=True):
-        try:
-            # 清除之前的缓存
-            if 'employee_df' in st.session_state:
-                del st.session_state['employee_df']
-            if 'abnormal_employee_df' in st.session_state:
-                del st.session_state['abnormal_employee_df']
-
-            employee_df, abnormal_employee_df = merge_employee_files(onboard_file, resigned_file, transferred_file,
-                                                                     ORG_LEVEL_MAP[org_level])
-            st.session_state['employee_df'] = employee_df
-            st.session_state['abnormal_employee_df'] = abnormal_employee_df
-
-            if not abnormal_employee_df.empty:
-                st.success(f"✅ 合并成功！员工入转调离信息共 {len(employee_df)} 条记录，异常员工入转调离信息共 {len(abnormal_employee_df)} 条记录。")
-            else:
-                st.success(f"✅ 合并成功！员工入转调离信息共 {len(employee_df)} 条记录。")
-        except Exception as e:
-            st.error(f"❌ 合并失败：{e}")
+    if st.button("开始合并", use_container_width=True, disabled=job_running('merge_job')):
+        # 清除之前的结果，计算在后台任务中执行，页面保持可操作
+        for key in ('employee_df', 'abnormal_employee_df', 'all_levels_sheets', 'merge_spans'):
+            st.session_state.pop(key, None)
+        clear_download_cache('employee_df', 'abnormal_employee_df', 'all_levels_sheets')
+
+        if all_levels:
+            expected_stages = MERGE_ALL_LEVELS_STAGES
+        elif previous_file:
+            expected_stages = MERGE_INCREMENTAL_STAGES
+        else:
+            expected_stages = MERGE_STAGES
+        st.session_state['merge_job'] = submit_job(
+            with_session_context(run_merge_job), all_levels, onboard_file, resigned_file, transferred_file, ORG_LEVEL_MAP[org_level],
+            previous_file, previous_abnormal_file, timeline,
+            label="员工入转调离数据合并", expected_stages=expected_stages,
+            key=('merge', all_levels, content_hash(onboard_file), content_hash(resigned_file),
+                 content_hash(transferred_file), None if all_levels else ORG_LEVEL_MAP[org_level],
+                 content_hash(previous_file), content_hash(previous_abnormal_file), timeline)
+        )
+
+    render_job('merge_job', 'merge_spans')
+
+    render_spans('merge_spans')
+    render_memory_report({'employee_df': "员工入转调离数据", 'abnormal_employee_df': "异常员工入转调离数据",
+                          'all_levels_sheets': "全部组织层级"})
 
     if 'employee_df' in st.session_state:
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as w:
-            st.session_state['employee_df'].to_excel(w, index=False, sheet_name="合并结果")
         st.download_button(
             "📥 下载员工入转调离数据（Excel）",
-            data=output.getvalue(),
+            data=deferred_excel('employee_df', "合并结果", result_snapshot=True),
             file_name=f"员工入转调离数据_{org_level}.xlsx",
             use_container_width=False
         )
 
     if 'abnormal_employee_df' in st.session_state:
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as w:
-            st.session_state['abnormal_employee_df'].to_excel(w, index=False, sheet_name="合并结果")
         st.download_button(
             "📥 下载异常员工入转调离数据（Excel）",
-            data=output.getvalue(),
+            data=deferred_excel('abnormal_employee_df', "合并结果", result_snapshot=True),
             file_name=f"异常员工入转调离数据_{org_level}.xlsx",
             use_container_width=False
         )
+
+    if 'all_levels_sheets' in st.session_state:
+        st.download_button(
+            "📥 下载全部组织层级入转调离数据（Excel）",
+            data=deferred_excel('all_levels_sheets'),
+            file_name="员工入转调离数据_全部组织层级.xlsx",
+            use_container_width=False
+        )
 elif tab_options[selected_tab] == "tab2":
     st.subheader("📎 上传部门员工入转调离数据")
-    st.caption("文件需包含“月薪”列（单位：元），支持 .xlsx 格式")
+    st.caption("文件需包含“月薪”列（单位：元），支持 Excel、CSV 与 Parquet 格式")
     st.query_params["active_tab"] = "tab2"
 
-    budget_file = st.file_uploader("员工薪资数据文件", type=["xlsx", "xls"])
+    budget_file = st.file_uploader("员工薪资数据文件", type=UPLOAD_TYPES)
 
     st.subheader("📅 设置核算年度")
-    budget_year = st.text_input("核算年度", value="2025", placeholder="例如：2025")
+    multi_year = st.checkbox("多年度核算（文件只解析一次，同时计算多个年度）")
+    if multi_year:
+        col1, col2 = st.columns(2)
+        with col1:
+            start_year = st.text_input("起始年度", value="2023", placeholder="例如：2023")
+        with col2:
+            end_year = st.text_input("结束年度", value="2025", placeholder="例如：2025")
+        budget_label = f"{start_year}-{end_year}"
+    else:
+        budget_year = st.text_input("核算年度", value="2025", placeholder="例如：2025")
+        budget_label = budget_year
 
     st.write("")
-    if st.button("🧮 计算年度月度沟通经费", use_container_width=True):
-        if not budget_year.strip():
+    if st.button("🧮 计算年度月度沟通经费", use_container_width=True, disabled=job_running('budget_job')):
+        # 提交任务前先检查上传文件，避免在任务中失败后显示堆栈
+        if not budget_file:
+            st.warning("请上传员工入转调离数据文件。")
+        elif multi_year and not (start_year.strip() and end_year.strip()):
+            st.error("❌ 请输入有效的起始年度和结束年度。")
+        elif not multi_year and not budget_year.strip():
             st.error("❌ 请输入有效的核算年度。")
         else:
             try:
-                detail_df, total = calculate_budget(budget_file, int(budget_year))
-                st.session_state['budget_df'] = detail_df
-                st.session_state['total_budget'] = total
-                st.success(f"✅ 计算完成！年度总经费：**{total:,.2f} 元**")
-            except Exception as e:
+                years = (int(start_year), int(end_year)) if multi_year else (int(budget_year),)
+            except ValueError:
                 st.error(f"❌ 计算失败：{traceback.format_exc()}")
+            else:
+                for key in ('budget_sheets', 'budget_spans'):
+                    st.session_state.pop(key, None)
+                clear_download_cache('budget_sheets')
+                st.session_state['budget_job'] = submit_job(
+                    with_session_context(run_budget_job), budget_file, *years,
+                    label="年度月度沟通经费计算", expected_stages=BUDGET_STAGES,
+                    key=('budget', content_hash(budget_file), years)
+                )
+
+    render_job('budget_job', 'budget_spans', show_traceback=True)
+
+    render_spans('budget_spans')
+    render_memory_report({'budget_sheets': "经费结果"})
+
+    if 'budget_sheets' in st.session_state:
+        st.subheader("🏢 组织经费汇总")
+        st.caption("按 合计 / 一级 ~ 四级组织 汇总人数（计算月数大于 0 的员工）、计算月数与年度经费，导出时为“组织汇总” sheet")
+        st.dataframe(st.session_state['budget_sheets']["组织汇总"], use_container_width=True, hide_index=True)
 
-    if 'budget_df' in st.session_state:
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as w:
-            st.session_state['budget_df'].to_excel(w, index=False, sheet_name="经费明细")
         st.download_button(
             "📥 下载经费结果（Excel）",
-            data=output.getvalue(),
-            file_name=f"年度经费核算_{budget_year}.xlsx",
+            data=deferred_excel('budget_sheets'),
+            file_name=f"年度经费核算_{budget_label}.xlsx",
             use_container_width=False
         )
 elif tab_options[selected_tab] == "tab3":